@@ -0,0 +1,226 @@
+#! /usr/bin/python3
+'''
+Benchmarks over the puzzle libraries in keys/, without tkinter.
+
+For every puzzle in every library file the stages below are timed, and
+for each dimension the count, total time, throughput and p50/p90/p99
+per stage are reported:
+    decode            decode.decode of the puzzle code
+    load              Puzzle construction (decoding, cages, coloring)
+    cageGraph         building the CageGraph
+    minimumColoring   exact coloring
+    iteratedGreedy    GraphColorer.iteratedGreedy(50, 4)
+    color6            the planar 6-coloring fallback
+    solve             Puzzle.solve
+    toggleCandidate   one candidate toggled on, per call
+    enterAnswer       one answer entered, per call
+    undo, redo        one step, per call
+
+The whole run is repeated (--repeat, 3 by default), and for each stage
+the repeat with the lowest median is kept, which damps the noise of a
+busy machine.  Stages with fewer than MINSAMPLES timings in a repeat
+(as with a small --limit) are reported but not compared.
+
+The results are written as JSON (bench_output.json by default) and
+compared with the baseline, bench_baseline.json in the top directory.
+The run fails (exit status 1) if the median time of any stage is worse
+than the baseline's by more than the threshold, and (exit status 2) if
+there is no baseline.  Timings depend on the machine, so the baseline
+is not kept in git: make it with --save-baseline on the machine that
+runs the comparison, from the revision to compare against, and keep it
+there (a CI job should cache it with the runner).
+
+The disk caches (see diskcache.py) are pointed at an empty temporary
+directory, so every run starts cold, unless --warm is given.
+
+    python3 bench.py [--limit N] [--repeat N] [--baseline FILE] [--save-baseline]
+                     [--threshold FRACTION] [--output FILE] [--warm]
+'''
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+MINSAMPLES = 200         # timings a stage needs to be compared
+STAGES = ('decode', 'load', 'cageGraph', 'minimumColoring', 'iteratedGreedy',
+          'color6', 'solve', 'toggleCandidate', 'enterAnswer', 'undo', 'redo')
+
+
+def percentile(samples, p):
+    # samples must be sorted
+    if not samples:
+        return 0.0
+    k = min(len(samples) - 1, int(p / 100 * len(samples)))
+    return samples[k]
+
+
+def summarize(samples) -> dict:
+    # Statistics of a list of durations in seconds; times are in ms
+
+    samples = sorted(samples)
+    total = sum(samples)
+    return {'count': len(samples),
+            'total': total * 1000,
+            'perSecond': len(samples) / total if total else 0.0,
+            'p50': percentile(samples, 50) * 1000,
+            'p90': percentile(samples, 90) * 1000,
+            'p99': percentile(samples, 99) * 1000}
+
+
+def benchPuzzle(code, times):
+    # Time the stages for one puzzle, adding the durations to times,
+    # a dict of lists by stage
+
+    from decode import decode
+    from puzzle import Puzzle
+    from coloring import CageGraph, GraphColorer, minimumColoring, color6
+
+    clock = time.perf_counter
+
+    def timed(stage, f, *args):
+        start = clock()
+        result = f(*args)
+        times[stage].append(clock() - start)
+        return result
+
+    timed('decode', decode, code)
+    puzzle = timed('load', Puzzle, None, code)
+    dim = puzzle.dim
+    graph = timed('cageGraph', CageGraph, puzzle.grid.cageOf, dim)
+    timed('minimumColoring', minimumColoring, graph)
+    timed('iteratedGreedy', GraphColorer(graph).iteratedGreedy, 50, 4)
+    timed('color6', color6, graph.adjacency())
+    solution = timed('solve', puzzle.solve)
+
+    cells = sorted(solution)
+    for cell in cells:
+        for value in range(1, dim+1):
+            if value != solution[cell]:
+                timed('toggleCandidate', puzzle.toggleCandidate, cell, value)
+    for cell in cells:
+        timed('enterAnswer', puzzle.enterAnswer, cell, solution[cell])
+    assert puzzle.isCompleted()
+    while timed('undo', puzzle.undo):
+        pass
+    while timed('redo', puzzle.redo):
+        pass
+    assert puzzle.isCompleted()
+
+
+def run(limit=0, repeat=1) -> dict:
+    # Benchmark every library in keys/, at most limit puzzles from
+    # each if limit is set, repeat times.  Return the results by
+    # dimension, keeping for each stage the repeat with the lowest median.
+
+    results = {}
+    for r in range(repeat):
+        times = {}           # dim -> stage -> durations
+        for path in sorted(glob.glob('keys/*.txt')):
+            with open(path) as fin:
+                codes = [line.strip() for line in fin if line.strip()]
+            if limit:
+                codes = codes[:limit]
+            for code in codes:
+                dimTimes = times.setdefault(code.split(':')[0],
+                                            {stage: [] for stage in STAGES})
+                benchPuzzle(code, dimTimes)
+            print(f'{path}: {len(codes)} puzzles (run {r+1} of {repeat})', file=sys.stderr)
+        for dim, dimTimes in sorted(times.items()):
+            best = results.setdefault(dim, {})
+            for stage in STAGES:
+                stats = summarize(dimTimes[stage])
+                if stage not in best or stats['p50'] < best[stage]['p50']:
+                    best[stage] = stats
+    return results
+
+
+def compare(results, baseline, threshold) -> tuple:
+    # List the stages whose median is more than threshold (a fraction)
+    # slower than in the baseline, and those with too few timings, in
+    # either, to compare
+
+    regressions, skipped = [], []
+    for dim, stages in results.items():
+        for stage, stats in stages.items():
+            old = baseline.get(dim, {}).get(stage)
+            if not old or not old['p50']:
+                continue
+            if min(stats['count'], old['count']) < MINSAMPLES:
+                skipped.append((dim, stage))
+                continue
+            ratio = stats['p50'] / old['p50']
+            if ratio > 1 + threshold:
+                regressions.append((dim, stage, old['p50'], stats['p50'], ratio))
+    return regressions, skipped
+
+
+def report(results):
+    print(f"{'dim':>3} {'stage':<16} {'count':>7} {'per sec':>10} "
+          f"{'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}")
+    for dim, stages in results.items():
+        for stage, s in stages.items():
+            print(f"{dim:>3} {stage:<16} {s['count']:>7} {s['perSecond']:>10.0f} "
+                  f"{s['p50']:>9.4f} {s['p90']:>9.4f} {s['p99']:>9.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the puzzle libraries.')
+    parser.add_argument('--limit', type=int, default=0,
+                        help='puzzles to take from each library (default all)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs, keeping the best median of each stage (default %(default)s)')
+    parser.add_argument('--output', default='bench_output.json',
+                        help='file for the results (default %(default)s)')
+    parser.add_argument('--baseline', default='bench_baseline.json',
+                        help='results to compare with (default %(default)s)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='save the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown of a median, as a fraction (default %(default)s)')
+    parser.add_argument('--warm', action='store_true',
+                        help='use the real disk caches instead of empty ones')
+    args = parser.parse_args()
+
+    if not args.warm:
+        os.environ['XDG_CACHE_HOME'] = tempfile.mkdtemp(prefix='kenken-bench-')
+    results = run(args.limit, max(1, args.repeat))
+    report(results)
+    output = {'python': platform.python_version(),
+              'machine': platform.machine(),
+              'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'limit': args.limit,
+              'repeat': args.repeat,
+              'results': results}
+    with open(args.output, 'w') as fout:
+        json.dump(output, fout, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as fout:
+            json.dump(output, fout, indent=1)
+        print(f'saved baseline {args.baseline}')
+        return 0
+
+    try:
+        with open(args.baseline) as fin:
+            baseline = json.load(fin)['results']
+    except FileNotFoundError:
+        print(f'FAILED: no baseline {args.baseline}; run with --save-baseline '
+              f'to make one', file=sys.stderr)
+        return 2
+    regressions, skipped = compare(results, baseline, args.threshold)
+    if skipped:
+        print(f'{len(skipped)} stages with fewer than {MINSAMPLES} timings not compared: '
+              + ', '.join(f'{dim}/{stage}' for dim, stage in skipped))
+    for dim, stage, old, new, ratio in regressions:
+        print(f'REGRESSION dim {dim} {stage}: p50 {old:.4f} ms -> {new:.4f} ms ({ratio:.2f}x)')
+    if regressions:
+        return 1
+    print(f'no stage slower than baseline by more than {args.threshold:.0%}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
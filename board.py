@@ -2,6 +2,8 @@ import tkinter as tk
 from tkinter import font
 import time
 
+from timing import timed
+
 ADD = '+'
 SUB = '\u2212'
 MUL = '\xd7'
@@ -15,6 +17,10 @@ candidateSize = 20
 baseHeight = 1020
 baseWidth = 1200
 
+frameTime = 16      # ms; resizing renders at most once per frame
+settleTime = 150    # ms without a resize before the final exact render
+hintTime = 8000     # ms the reason for a hint stays on the board
+
 
 # cageColor = ('#FFDCA0', '#F0C8C8', '#DCFFFF', '#C4C4FF', '#E5D6B4', '#D6ED84')
 cageColor = ('cornflower blue',
@@ -25,6 +31,42 @@ cageColor = ('cornflower blue',
              'cyan3',)
 
 
+def chainEdges(edges):
+    # Join a set of unit edges, each a pair of grid points (i, j),
+    # into as few polylines as a greedy walk finds, going straight on
+    # where possible.  Return a list of point lists, with the points
+    # in the middle of straight runs left out.
+
+    ends = {}
+    for a, b in edges:
+        ends.setdefault(a, []).append(b)
+        ends.setdefault(b, []).append(a)
+    # start walks at the ends of open paths, so they aren't broken up
+    starts = [p for p in ends if len(ends[p]) % 2] + list(ends)
+    paths = []
+    for start in starts:
+        if not ends[start]:
+            continue
+        path = [start]
+        here, step = start, None
+        while ends[here]:
+            nexts = ends[here]
+            ahead = None
+            if step:
+                ahead = (here[0] + step[0], here[1] + step[1])
+            there = ahead if ahead in nexts else nexts[0]
+            nexts.remove(there)
+            ends[there].remove(here)
+            newStep = (there[0] - here[0], there[1] - here[1])
+            if newStep == step:
+                path[-1] = there            # straight on: extend the run
+            else:
+                path.append(there)
+            here, step = there, newStep
+        paths.append(path)
+    return paths
+
+
 class Board(tk.Canvas):
     # View
 
@@ -33,57 +75,199 @@ class Board(tk.Canvas):
         tk.Canvas.__init__(self, win, height=height, width=width,
                            bg=bg, cursor=cursor)
         self.parent = parent
+        self.dim = None           # no puzzle loaded yet
+        # The fonts are made once and shared by every puzzle shown
         self.clueFont = font.Font(
             family='JetBrains Mono', size=clueSize, weight='bold')
         self.solutionFont = font.Font(
             family='JetBrains Mono', size=solutionSize, weight='bold')
         self.candidateFont = font.Font(
             family='JetBrains Mono', size=candidateSize, weight='bold')
-
-    def draw(self, dim):
-        self.bind('<Configure>', self.redraw)
+        # font sizes are scaled with the cells on resizing
+        self.fontSizes = ((self.clueFont, clueSize),
+                          (self.solutionFont, solutionSize),
+                          (self.candidateFont, candidateSize))
+        self.baseCell = None      # cell size at which fonts have base sizes
+        # resize scheduling; see onConfigure
+        self.pendingSize = None
+        self.frameJob = None
+        self.settleJob = None
+        self.lastFrame = 0.0
+        self.scaled = False
+        self.hintJob = None       # removes the reason for a hint; see showHint
+        self.flashJobs = set()    # pending steps of flash
+
+    @timed('Board.load')
+    def load(self, puzzle):
+        # Show a new puzzle on this board.  The board lives as long as
+        # the application.  If the new puzzle has the same dimension as
+        # the last, and the canvas hasn't changed size, the cells are
+        # kept and only the cages are redrawn; otherwise the board is
+        # rebuilt from scratch.
+
+        self.bind('<Configure>', self.onConfigure)
+        for job in (self.frameJob, self.settleJob):
+            if job:
+                self.after_cancel(job)
+        self.frameJob = self.settleJob = None
+        # Flashes still running hold the last puzzle's cell colors
+        self.cancelFlashes()
         width = self.winfo_width()
         height = self.winfo_height()
-        self.dim = dim
-        self.createCells(height, width)
-        control = self.parent.control
-        for cage in control.getCages():
-            self.drawCage(cage)
-        self.current = (0, 0)
-        self.enterCell((0, 0))         # initial focus in upper lefthand corner
+        if puzzle.dim == self.dim and not self.scaled and \
+                self.geometry(height, width) == (self.cellWidth, self.cellHeight, self.x0, self.y0):
+            self.delete('cage')
+            self.clearHint()
+            self.itemconfigure('rect', fill='')
+            self.itemconfigure('atext', text='')
+            self.itemconfigure('ctext', text='')
+            self.walls = set()
+            for cage in puzzle.cages.values():
+                self.drawCage(cage)
+            self.enterCell((0, 0))
+        else:
+            self.dim = puzzle.dim
+            self.current = (0, 0)
+            self.baseCell = None
+            self.rebuild(height, width)
+        self.itemconfigure('cursor', state=tk.NORMAL)
         self.focus_set()              # make canvas respond to keystrokes
         self.activate()               # activate event bindings
 
-    def redraw(self, event):
+    def geometry(self, height, width):
+        # Cell width and height, and origin of the grid, on a canvas
+        # of the given size
+
+        dim = self.dim
+        cw = (width - 10) // dim
+        ch = (height - 10) // dim
+        return cw, ch, (width - dim * cw) // 2, (height - dim * ch) // 2
+
+    def rebuild(self, height, width):
+        # Create all the items on the board from scratch
+
         self.clearAll()
-        self.createCells(event.height, event.width)
+        self.createCells(height, width)
+        if self.baseCell is None and self.cellWidth > 0 and self.cellHeight > 0:
+            self.baseCell = self.cellWidth, self.cellHeight
+        self.scaleFonts(self.fontFactor())
+        self.scaled = False
         control = self.parent.control
+        self.walls = set()        # cage walls drawn so far, as in drawCage
         for cage in control.getCages():
             self.drawCage(cage)
-        updates = control.getEntries()
-        for update in updates:
-            self.postUpdate(update)
-        try:
-            self.enterCell(self.current)
-        except (AttributeError, TypeError):
-            pass
+        self.postUpdate(control.getEntries())
+        current, self.current = self.current, (0, 0)   # cursor starts at (0, 0)
+        self.enterCell(current)
+
+    def onConfigure(self, event):
+        # A drag sends a burst of <Configure> events.  Keep only the
+        # latest size, render it at most once per frame, and once the
+        # sizes stop coming, render it exactly.
+
+        self.pendingSize = event.width, event.height
+        if self.settleJob:
+            self.after_cancel(self.settleJob)
+        self.settleJob = self.after(settleTime, self.settle)
+        if self.frameJob is None:
+            wait = frameTime - (time.monotonic() - self.lastFrame) * 1000
+            if wait > 0:
+                self.frameJob = self.after(int(wait) + 1, self.renderFrame)
+            else:
+                self.frameJob = self.after_idle(self.renderFrame)
+
+    def renderFrame(self):
+        self.frameJob = None
+        self.lastFrame = time.monotonic()
+        self.redraw(*self.pendingSize)
+
+    def settle(self):
+        # The resizing has stopped.  Scaling leaves fractional
+        # coordinates behind, so rebuild the board at the final size.
+
+        self.settleJob = None
+        if self.frameJob:
+            self.after_cancel(self.frameJob)
+            self.frameJob = None
+        width, height = self.pendingSize
+        if self.scaled:
+            self.rebuild(height, width)
+        else:
+            self.redraw(width, height)
+
+    @timed('Board.redraw')
+    def redraw(self, width, height):
+        # The canvas was resized.  Rescale the existing items in place
+        # to the new cell size, rather than recreating them.
+
+        if self.dim is None:          # nothing drawn yet
+            return
+        cw, ch, x0, y0 = self.geometry(height, width)
+        if cw <= 0 or ch <= 0:        # too small to draw anything
+            return
+        if self.cellWidth <= 0 or self.cellHeight <= 0:
+            # drawn before the canvas had a real size
+            self.rebuild(height, width)
+            return
+        if (cw, ch, x0, y0) == (self.cellWidth, self.cellHeight, self.x0, self.y0):
+            return
+        self.scale('all', self.x0, self.y0, cw / self.cellWidth, ch / self.cellHeight)
+        self.move('all', x0 - self.x0, y0 - self.y0)
+        self.cellWidth, self.cellHeight, self.x0, self.y0 = cw, ch, x0, y0
+        self.scaleFonts(self.fontFactor())
+        self.scaled = True
+
+    def fontFactor(self):
+        # Ratio of the current cell size to the base cell size
+
+        if self.baseCell is None:
+            return 1
+        bw, bh = self.baseCell
+        return min(self.cellWidth / bw, self.cellHeight / bh)
+
+    def scaleFonts(self, factor):
+        # Set the fonts to factor times their base sizes.
+        # Every item using a font follows it.
+
+        for f, size in self.fontSizes:
+            f.configure(size=max(1, round(size * factor)))
 
     def createCells(self, height, width):
+        # Create the items belonging to each cell: its rectangle and
+        # the texts for its answer and candidates.  These are kept
+        # when a new puzzle of the same dimension is loaded.
+
         dim = self.dim
-        self.cellWidth = cw = (width - 10) // dim
-        self.cellHeight = ch = (height - 10) // dim
+        cw, ch, x0, y0 = self.geometry(height, width)
+        self.cellWidth, self.cellHeight = cw, ch
         # cell origin is (x0, y0)
-        x0 = self.x0 = (width - dim * cw) // 2
-        y0 = self.y0 = (height - dim * ch) // 2
-
-        for j, x in enumerate(range(self.x0, self.x0+dim*cw, cw)):
-            for k, y in enumerate(range(self.y0,  self.y0+dim*ch, ch)):
-                tag = 'rect%d%d' % (j, k)
-                self.create_rectangle(x, y, x + cw, y + ch, tag=tag)
+        self.x0, self.y0 = x0, y0
+
+        # Item ids of each cell's rectangle, answer and candidates,
+        # indexed by j*dim + k for cell (j, k).  Looking items up by id
+        # saves Tk resolving a tag on every update.
+        self.rectItems = rects = []
+        self.answerItems = answers = []
+        self.candItems = cands = []
+        for x in range(self.x0, self.x0+dim*cw, cw):
+            for y in range(self.y0,  self.y0+dim*ch, ch):
+                rects.append(self.create_rectangle(x, y, x + cw, y + ch, tag='rect'))
+                answers.append(self.create_text(x + cw//2, y + ch//2, text='',
+                                                font=self.solutionFont, anchor=tk.CENTER,
+                                                tag='atext', fill='black'))
+                cands.append(self.create_text(x + cw - 5, y + 2, text='',
+                                              font=self.candidateFont, anchor=tk.NE,
+                                              justify=tk.LEFT, tag='ctext', fill='black'))
+        # the frame of the grid is drawn once, not with the cages
+        self.create_rectangle(x0, y0, x0 + dim*cw, y0 + dim*ch, width=3, tag='frame')
         self.create_polygon(x0, y0+ch//2, x0+cw//4, y0+3*ch//4, x0, y0+ch,
                             fill='khaki3', tag='cursor')
 
     def drawCage(self, cage):
+        # Color the cells of the cage and draw its walls and formula.
+        # The walls and formula are tagged 'cage', so they can be
+        # removed when the next puzzle is loaded.
+
         x0 = self.x0
         y0 = self.y0
         ch = self.cellHeight
@@ -92,36 +276,29 @@ class Board(tk.Canvas):
         value = cage.value
         bground = cageColor[cage.color]
 
+        # Collect the cage's walls as edges between grid points.
+        # Walls on the frame, and walls already drawn with a
+        # neighboring cage, are skipped, so each is drawn just once.
+        dim = self.dim
+        edges = set()
         for (j, k) in cage:
-            self.itemconfigure('rect%d%d' % (j, k), fill=bground)
-            w = x0 + j*cw
-            e = w + cw
-            n = y0 + k*ch
-            s = n + ch
-            if (j-1, k) not in cage:
-                self.create_line(w, n, w, s, width=3,
-                                 fill='black')  # western bdry
-            if (j+1, k) not in cage:
-                self.create_line(e, n, e,  s, width=3,
-                                 fill='black')  # eastern bdry
-            if (j, k-1) not in cage:
-                self.create_line(w, n, e, n, width=3,
-                                 fill='black')   # northern bdry
-            if (j, k+1) not in cage:
-                self.create_line(w, s, e, s, width=3,
-                                 fill='black')    # southern bdry
-            atag = 'a%d%d' % (j, k)
-            ctag = 'c%d%d' % (j, k)
-            x = (e + w) // 2
-            y = (n + s) // 2
-            self.create_text(x, y, text='', font=self.solutionFont, anchor=tk.CENTER,
-                             tag=atag, fill='black')
-            self.addtag_withtag('atext', atag)
-            x = e - 5
-            y = n + 2
-            self.create_text(x, y, text='', font=self.candidateFont, tag=ctag,
-                             anchor=tk.NE, justify=tk.LEFT, fill='black')
-            self.addtag_withtag('ctext', ctag)
+            self.itemconfigure(self.rectItems[j*dim + k], fill=bground)
+            if j > 0 and (j-1, k) not in cage:
+                edges.add(((j, k), (j, k+1)))             # western bdry
+            if j < dim-1 and (j+1, k) not in cage:
+                edges.add(((j+1, k), (j+1, k+1)))         # eastern bdry
+            if k > 0 and (j, k-1) not in cage:
+                edges.add(((j, k), (j+1, k)))             # northern bdry
+            if k < dim-1 and (j, k+1) not in cage:
+                edges.add(((j, k+1), (j+1, k+1)))         # southern bdry
+        edges -= self.walls
+        self.walls |= edges
+        for path in chainEdges(edges):
+            coords = []
+            for i, j in path:
+                coords.extend((x0 + i*cw, y0 + j*ch))
+            self.create_line(*coords, width=3, fill='black',
+                             capstyle=tk.PROJECTING, tag='cage')
 
         # formula in upper lefthand corner
 
@@ -129,21 +306,27 @@ class Board(tk.Canvas):
         jmin = min([j for(j, k) in cage if k == kmin])
         j, k = x0+cw*jmin+4, y0 + ch*kmin+5
         self.create_text(j, k, text='%s%s' % (value, op),
-                         font=self.clueFont, anchor=tk.NW, fill='black', tag='formula')
+                         font=self.clueFont, anchor=tk.NW, fill='black', tags=('formula', 'cage'))
 
     def clearAll(self):
-        objects = self.find_all()
-        for object in objects:
-            self.delete(object)
+        self.delete('all')
 
-    def flash(self, rects, num):
+    def flash(self, rects, num, job=None):
+        # job is the id of the after call that ran this step, if any
+        self.flashJobs.discard(job)
         if num == 0:
             return
-        for tag, bg, color in rects:
+        for item, bg, color in rects:
             col = bg if num % 2 else color
-            self.itemconfigure(tag, fill=col)
+            self.itemconfigure(item, fill=col)
         self.update_idletasks()
-        self.after(100, lambda: self.flash(rects, num-1))
+        later = self.after(100, lambda: self.flash(rects, num-1, later))
+        self.flashJobs.add(later)
+
+    def cancelFlashes(self):
+        for job in self.flashJobs:
+            self.after_cancel(job)
+        self.flashJobs.clear()
 
     def highlight(self, cells, color='yellow', num = 2):
         # Flash given cells in the given highlight color, num times
@@ -153,18 +336,18 @@ class Board(tk.Canvas):
         # to be able to restore them, then call flash.
 
         rects = []
-        for cell in cells:
-            tag = 'rect%d%d' % cell
-            bg = self.itemcget(tag, 'fill')
-            rects.append((tag, bg, color))
+        for j, k in cells:
+            item = self.rectItems[j*self.dim + k]
+            bg = self.itemcget(item, 'fill')
+            rects.append((item, bg, color))
         self.flash(rects, 2*num)
 
         # Very occasionally we end up with a cell colored wrong.
         # I can't understand what causes this, so I'm just explicitly
         # putting eveything bcak to the right color at the end.
 
-        for tag, bg, _ in rects:
-            self.itemconfigure(tag, fill=bg)
+        for item, bg, _ in rects:
+            self.itemconfigure(item, fill=bg)
         self.update_idletasks()
 
     def candidateString(self, cands):
@@ -181,7 +364,6 @@ class Board(tk.Canvas):
         # Give focus to cell
         # Sets self.current
 
-        tag = 'rect%d%d' % cell
         old = self.current
         deltaX = (cell[0] - old[0])*self.cellWidth
         deltaY = (cell[1] - old[1])*self.cellHeight
@@ -189,31 +371,79 @@ class Board(tk.Canvas):
         self.current = cell
         self.move('cursor', deltaX, deltaY)
 
-    def postUpdate(self, update):
-        if not update:
-            return
-
-        coords = update.coords
-        cands = update.candidates
-        answer = update.answer
-        atag = 'a%d%d' % coords
-        ctag = 'c%d%d' % coords
+    @timed('Board.postUpdate')
+    def postUpdate(self, updates):
+        # Post a batch of updates (a list, as returned by the
+        # puzzle) to the board in a single pass
 
-        if answer:
-            self.itemconfigure(ctag, text='')
-            self.itemconfigure(atag, text=str(answer))
+        dim = self.dim
+        answerItems, candItems = self.answerItems, self.candItems
+        for (j, k), answer, cands in updates:
+            index = j*dim + k
+            if answer:
+                self.itemconfigure(candItems[index], text='')
+                self.itemconfigure(answerItems[index], text=str(answer))
+            else:
+                self.itemconfigure(candItems[index], text=self.candidateString(cands))
+                self.itemconfigure(answerItems[index], text='')
+
+    def showLatency(self, p50, p99):
+        # Debug overlay in the top left corner giving the median and
+        # 99th percentile keystroke latency, in seconds
+
+        text = 'keystroke p50 %.1f ms  p99 %.1f ms' % (p50 * 1000, p99 * 1000)
+        if self.find_withtag('hud'):
+            self.itemconfigure('hud', text=text)
         else:
-            self.itemconfigure(ctag, text=self.candidateString(cands))
-            self.itemconfigure(atag, text='')
-
-    def undo(self, update):
-        self.postUpdate(update)
-        self.enterCell(update.coords)
+            self.create_text(4, 2, text=text, anchor=tk.NW, fill='red',
+                             font='TkFixedFont', tag='hud')
+        self.tag_raise('hud')
+
+    def showHint(self, hint):
+        # Show a hint (see Puzzle.hint): flash the cells it is based on
+        # in light blue and those it concludes about in yellow, or a
+        # wrong answer in red, move the focus to the first of the
+        # latter, and give the reason across the bottom of the board
+        # for a few seconds.
+
+        targets = list(hint.values)
+        basis = [cell for cell in hint.cells if cell not in hint.values]
+        if basis:
+            self.highlight(basis, 'light blue')
+        self.highlight(targets, 'red' if hint.level == 0 else 'yellow')
+        self.enterCell(targets[0])
+
+        self.clearHint()
+        width, height = self.winfo_width(), self.winfo_height()
+        text = self.create_text(width // 2, height - self.y0 - 4, text=hint.reason,
+                                anchor=tk.S, width=width - 40, justify=tk.CENTER,
+                                font='TkDefaultFont', tag='hint')
+        x0, y0, x1, y1 = self.bbox(text)
+        self.create_rectangle(x0 - 4, y0 - 2, x1 + 4, y1 + 2, fill='white',
+                              outline='black', tag=('hint', 'hintbg'))
+        self.tag_raise('hintbg')
+        self.tag_raise(text)
+        self.hintJob = self.after(hintTime, self.clearHint)
+
+    def clearHint(self):
+        if self.hintJob:
+            self.after_cancel(self.hintJob)
+        self.hintJob = None
+        self.delete('hint')
+
+    def undo(self, updates):
+        # The first update is for the cell the user changed
+        if not updates:
+            return
+        self.postUpdate(updates)
+        self.enterCell(updates[0].coords)
         self.itemconfigure('cursor', state=tk.NORMAL)
 
-    def redo(self, update):
-        self.postUpdate(update)
-        self.enterCell(update.coords)
+    def redo(self, updates):
+        if not updates:
+            return
+        self.postUpdate(updates)
+        self.enterCell(updates[0].coords)
         if self.parent.puzzle.isCompleted():
             self.itemconfigure('cursor', state=tk.HIDDEN)
 
@@ -0,0 +1,295 @@
+'''
+Coloring of the cages of a puzzle, so that cages sharing a wall get
+different background colors on the board.
+
+CageGraph is the graph of the cages, built in one pass over the walls
+of the grid.  minimumColoring colors it with as few colors as possible
+by backtracking, which is quick for graphs of a few dozen cages, and
+GraphColorer colors it heuristically, with DSatur followed by the
+iterated greedy algorithm, for when backtracking takes too long.
+
+Colorings are cached on disk by puzzle code in colorings, so a puzzle
+is colored only once and always looks the same.
+'''
+from heapq import heapify, heappop, heappush
+from random import random, shuffle, randint
+
+from diskcache import DiskCache
+
+CACHEVERSION = 1
+BUDGET = 20000           # search nodes minimumColoring may visit
+
+
+class GiveUp(Exception):
+    pass
+
+
+class CageGraph:
+    # The cages of a puzzle as a graph.  Vertices are the cage
+    # numbers 0, 1, ..., n-1, and nbrs[v] is the set of cages sharing
+    # a wall with cage v.
+
+    def __init__(self, cageOf, dim: int) -> None:
+        # cageOf gives the cage number of each cell by flat index
+        # x*dim + y, as in Grid.cageOf.  Each cell is compared with the
+        # cells below and to the right of it, so each interior edge of
+        # the grid is looked at once.
+
+        size = dim * dim
+        self.n = n = max(cageOf) + 1 if size else 0
+        self.nbrs = nbrs = [set() for _ in range(n)]
+        for i in range(size):
+            c = cageOf[i]
+            if i % dim != dim-1:
+                d = cageOf[i+1]              # cell (x, y+1)
+                if d != c:
+                    nbrs[c].add(d)
+                    nbrs[d].add(c)
+            if i + dim < size:
+                d = cageOf[i+dim]            # cell (x+1, y)
+                if d != c:
+                    nbrs[c].add(d)
+                    nbrs[d].add(c)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def adjacency(self) -> dict:
+        # A copy of the graph as a dict of neighbor sets, which the
+        # caller may change
+
+        return {v: set(nbrs) for v, nbrs in enumerate(self.nbrs)}
+
+    def proper(self, coloring) -> bool:
+        # Is coloring, a sequence of colors indexed by vertex, a
+        # coloring of this graph with no two neighbors alike?
+
+        if len(coloring) != self.n:
+            return False
+        return all(coloring[u] != coloring[v]
+                   for v, nbrs in enumerate(self.nbrs) for u in nbrs)
+
+
+def minimumColoring(graph: CageGraph, budget: int = BUDGET) -> list:
+    # Color graph with as few colors as possible.  Return the list of
+    # colors indexed by vertex, or None if the search gives up after
+    # visiting budget nodes.
+    # For k = 1, 2, ... try to color the graph with k colors, taking
+    # the vertices in DSatur order (most colored neighbors first) and
+    # backtracking on a vertex with no color left.  A color not yet
+    # used is tried only once, since all unused colors are alike.
+    # The search is deterministic, so a graph always gets the same
+    # coloring.
+
+    n, nbrs = len(graph), graph.nbrs
+    degree = [len(s) for s in nbrs]
+    color = [-1] * n
+    nodes = 0
+
+    def extend(colored, used, k):
+        # Color the remaining vertices with colors below k, given that
+        # colored vertices are colored, with colors below used.
+        # Return True on success.
+
+        nonlocal nodes
+        if colored == n:
+            return True
+        nodes += 1
+        if nodes > budget:
+            raise GiveUp
+        best, bestKey, bestMask = -1, None, 0
+        for v in range(n):
+            if color[v] < 0:
+                mask = 0
+                for u in nbrs[v]:
+                    if color[u] >= 0:
+                        mask |= 1 << color[u]
+                key = (mask.bit_count(), degree[v])
+                if bestKey is None or key > bestKey:
+                    best, bestKey, bestMask = v, key, mask
+        for c in range(min(used + 1, k)):
+            if not bestMask >> c & 1:
+                color[best] = c
+                if extend(colored + 1, max(used, c + 1), k):
+                    return True
+        color[best] = -1
+        return False
+
+    try:
+        for k in range(1, n + 1):
+            if extend(0, 0, k):
+                return color
+    except (GiveUp, RecursionError):
+        return None
+    return []
+
+
+def color6(graph: dict, color: dict = None) -> dict:
+    # Color a planar graph, given as a dict of neighbor sets, with at
+    # most 6 colors, and return the colors as a dict.  graph is
+    # consumed.
+
+    if color is None:
+        color = {}
+    if len(graph)== 1:
+        id = list(graph.keys())[0]
+        color[id] = 0
+        return color
+    for id in graph:   # There must be a vertex of degree <= 5
+        if len(graph[id]) < 6:
+            break
+    nbrs = graph.pop(id)  # remove it from the graph
+    for nbr in nbrs:
+        graph[nbr].remove(id)
+
+    # 6-color the remaining graph, then color the
+    # deleted vertex with a color unused by its neighbors
+
+    color6(graph, color)
+    nbdColors = {color[n] for n in nbrs}
+    color[id] = min(set(range(6))-nbdColors)
+    return color
+
+
+colorings = DiskCache(f'colorings-{CACHEVERSION}.pickle', 20000)
+
+
+class GraphColorer:
+    # Colorings are kept as arrays indexed by vertex: color[v] is the
+    # color of v, or -1 if v is uncolored, and colorClass[c] lists the
+    # vertices of color c.  The arrays are reused from one coloring to
+    # the next by the iterated greedy algorithm.
+
+    def __init__(self, graph: CageGraph) -> None:
+        V = self.V = list(range(len(graph)))
+        self.nbrs = graph.nbrs
+        self.n = len(self.V)
+        self.degree = [len(self.nbrs[i]) for i in V]
+        self.color = [-1] * self.n
+        self.colorClass = []     # colorClass[:colors] are in use
+        self.colors = 0
+
+    def reset(self) -> None:
+        # Uncolor every vertex
+
+        color = self.color
+        for v in self.V:
+            color[v] = -1
+        for c in self.colorClass:
+            c.clear()
+        self.colors = 0
+
+    def paint(self, v: int, used: int) -> int:
+        # Give v the smallest color not in the bitmask used,
+        # and return the color
+
+        c = (~used & (used + 1)).bit_length() - 1
+        self.color[v] = c
+        if c == self.colors:
+            self.colors += 1
+            if c == len(self.colorClass):
+                self.colorClass.append([])
+        self.colorClass[c].append(v)
+        return c
+
+    def DSatur(self) -> None:
+        # Color the vertices in order of greatest degree of saturation
+        # (number of colors among the neighbors), breaking ties by
+        # highest degree and then randomly.
+        # The uncolored vertices are kept in a heap.  Rather than moving
+        # a vertex when its saturation goes up, a new entry is pushed,
+        # and entries that are out of date are skipped when popped.
+
+        self.reset()
+        nbrs, degree, color = self.nbrs, self.degree, self.color
+        dsat = [0] * self.n
+        used = [0] * self.n      # bitmask of the colors of the neighbors
+        heap = [(0, -degree[v], random(), v) for v in self.V]
+        heapify(heap)
+        while heap:
+            s, _, _, v = heappop(heap)
+            if color[v] >= 0 or -s != dsat[v]:
+                continue         # stale entry
+            bit = 1 << self.paint(v, used[v])
+            for u in nbrs[v]:
+                if color[u] < 0 and not used[u] & bit:
+                    used[u] |= bit
+                    dsat[u] += 1
+                    heappush(heap, (-dsat[u], -degree[u], random(), u))
+
+    def greedy(self) -> None:
+        # Color the vertices in the order of self.V, giving each
+        # the smallest color not used by its neighbors
+
+        self.reset()
+        nbrs, color = self.nbrs, self.color
+        for v in self.V:
+            used = 0
+            for u in nbrs[v]:
+                if color[u] >= 0:
+                    used |= 1 << color[u]
+            self.paint(v, used)
+
+    def order(self, classes) -> None:
+        # Reorder the vertices class by class, in place
+
+        V = self.V
+        k = 0
+        for c in classes:
+            V[k:k+len(c)] = c
+            k += len(c)
+
+    def largestFirst(self) -> None:
+        # Reorder the vertices in order of the color classes
+        # in decreasing order of size
+
+        self.order(sorted(self.colorClass[:self.colors], key=len, reverse=True))
+
+    def reverse(self) -> None:
+        # Reorder the vertices in the reverse of the color classes
+
+        self.order(reversed(self.colorClass[:self.colors]))
+
+    def randomize(self) -> None:
+        # Reorder the vertices by shuffling the color classes
+
+        c = self.colorClass[:self.colors]
+        shuffle(c)
+        self.order(c)
+
+    def printV(self):
+        for v in self.V:
+            print(self.V, end = ' ')
+        print()
+
+    def iteratedGreedy(self, limit: int, goal:int = 0) -> tuple[list, int]:
+        # Iterated greedy coloring
+        # limit is the maximum number of colorings to try
+        # goal is a target for the number of colors; if
+        # this goal is achieved, the coloring stops early.
+        # The default goal is 0, so there is no target.
+        # Return the list of vertex colors and the number of tries.
+
+        self.DSatur()    # color initially with DSatur algorithm
+        tries = 1
+        if self.colors <= goal:
+            return self.color, 1
+        while tries < limit:
+            r = randint(1,13)
+
+            # Reorder the vertices according to largest first, reversal,
+            # or random shuffling randomly, with proportion 5:5:3, and
+            # then use the greedy algorithm.  Taking the classes in
+            # any order never needs more colors than before.
+
+            if r <= 5:
+                self.largestFirst()
+            elif r <= 10:
+                self.reverse()
+            else:
+                self.randomize()
+            self.greedy()
+            tries += 1
+            if self.colors <= goal:
+                break
+        return self.color, tries
@@ -0,0 +1,110 @@
+'''
+Table of the value combinations that satisfy each kind of cage.
+
+The valid tuples for a cage depend only on its operation, its target,
+dim, and its layout: which pairs of its cells share a row or column and
+so must get different values.  The layout is summarized by a signature,
+one bitmask per cell giving the earlier cells it clashes with, so cages
+of the same shape in different places share one table entry.
+
+Entries are kept in an in-memory LRU table, and persisted to a disk
+cache (see diskcache.py) when the program exits, so large
+multiplication cages need only be enumerated once.
+'''
+from diskcache import DiskCache
+
+ADD = '+'
+SUB = '\u2212'
+MUL = '\xd7'
+DIV = '/'
+
+CACHEVERSION = 2
+
+
+def signature(cells) -> tuple:
+    # Layout of a cage: for each cell, in order, the bitmask of the
+    # earlier cells sharing its row or column.  cells are (x, y) pairs.
+
+    return tuple(sum(1 << j for j in range(k)
+                     if cells[j][0] == cells[k][0] or cells[j][1] == cells[k][1])
+                 for k in range(len(cells)))
+
+
+def generate(op, value, sig, dim) -> tuple:
+    # All tuples of values, one per cell of a cage with layout sig,
+    # that satisfy the clue op value
+
+    n = len(sig)
+    values = range(1, dim+1)
+    if op in (SUB, DIV):
+        if n != 2:
+            return ()
+        if op == SUB:
+            pairs = [(a, a+value) for a in values if a+value <= dim]
+        else:
+            pairs = [(a, a*value) for a in values if a*value <= dim]
+        return tuple(pairs + [(b, a) for a, b in pairs])
+
+    clash = [[j for j in range(k) if sig[k] >> j & 1] for k in range(n)]
+    answer = []
+    partial = [0]*n
+
+    if op == ADD:
+        def extend(k, rest):
+            left = n - k - 1    # cells still to fill after this one
+            for v in values:
+                if rest - v < left or rest - v > left*dim:
+                    continue
+                if any(partial[j] == v for j in clash[k]):
+                    continue
+                partial[k] = v
+                if left:
+                    extend(k+1, rest-v)
+                else:
+                    answer.append(tuple(partial))
+    else:
+        def extend(k, rest):
+            left = n - k - 1
+            for v in values:
+                if rest % v:
+                    continue
+                if any(partial[j] == v for j in clash[k]):
+                    continue
+                partial[k] = v
+                if left:
+                    extend(k+1, rest//v)
+                elif rest == v:
+                    answer.append(tuple(partial))
+
+    if n:
+        extend(0, value)
+    return tuple(answer)
+
+
+class ComboTable(DiskCache):
+    def __init__(self, capacity: int = 4096, path: str = None) -> None:
+        # capacity is the most entries kept in memory; path is the
+        # disk cache file, or None for the default location
+
+        super().__init__(f'combos-{CACHEVERSION}.pickle', capacity, path)
+
+    def lookup(self, op, value, sig, dim) -> tuple:
+        # The tuples for a cage, from the table if they are there
+
+        key = (op, value, sig, dim)
+        tuples = self.get(key)
+        if tuples is None:
+            tuples = generate(op, value, sig, dim)
+            self.put(key, tuples)
+        return tuples
+
+
+table = ComboTable()
+
+
+def cageTuples(op, value, cells, dim) -> tuple:
+    # All tuples of values, in the order of cells, that satisfy the
+    # cage clue.  Cells of the cage that share a row or column get
+    # different values.  cells is a list of (x, y) pairs.
+
+    return table.lookup(op, value, signature(cells), dim)
@@ -1,6 +1,31 @@
 import tkinter as tk
 from tkinter import messagebox 
+from functools import wraps
+import time
 from puzzle import AnswerError
+from timing import timings
+
+
+def keystroke(handler):
+    # Time an event handler, and the whole path from the event to
+    # the redrawn board, when timing is on.  Tk redraws the canvas
+    # when it is next idle, so the path is taken to end when an idle
+    # callback queued after the handler runs.
+
+    name = 'Control.' + handler.__name__
+
+    @wraps(handler)
+    def timedHandler(self, event):
+        if not timings.enabled:
+            return handler(self, event)
+        start = time.perf_counter()
+        try:
+            return handler(self, event)
+        finally:
+            timings.add(name, time.perf_counter() - start)
+            self.parent.board.after_idle(self.rendered, start)
+    return timedHandler
+
 
 class Control(tk.Frame):
     def __init__(self, parent, win):
@@ -26,12 +51,16 @@ class Control(tk.Frame):
         self.bind_class('Board', 'n', self.newPuzzle)
         self.bind_class('Board', 'c', self.clearPuzzle)
         self.bind_class('Board', 'o', self.openPuzzle)
+        self.bind_class('Board', 'a', self.toggleInference)
+        self.bind_class('Board', 'h', self.hint)
         self.bind_class('Board', 'U', self.rollBack)
         self.bind_class('Board', 'R', self.rollForward)
         self.bind_class('Board', 'S', self.restartPuzzle)
         self.bind_class('Board', 'N', self.newPuzzle)
         self.bind_class('Board', 'C', self.clearPuzzle)
         self.bind_class('Board', 'O', self.openPuzzle)
+        self.bind_class('Board', 'A', self.toggleInference)
+        self.bind_class('Board', 'H', self.hint)
         self.bind_class('Board', '<Map>',  self.map)
         self.bind_class('Board', '<Unmap>',  self.unmap)
         
@@ -41,6 +70,7 @@ class Control(tk.Frame):
             self.bind_class('Board',f'<KeyPress-KP_{c}>',  self.toggleCandidate)
             self.bind_class('Board',f'<Control-KeyPress-KP_{c}>',  self.enterAnswer)            
 
+    @keystroke
     def arrowUp(self, event):
         board = self.parent.board
         focus = board.current
@@ -48,6 +78,7 @@ class Control(tk.Frame):
             return
         board.enterCell( (focus[0], focus[1]-1) )
 
+    @keystroke
     def arrowDown(self, event):
         board = self.parent.board
         focus = board.current
@@ -56,6 +87,7 @@ class Control(tk.Frame):
             return
         board.enterCell( (focus[0], focus[1]+1) )
 
+    @keystroke
     def arrowLeft(self, event):
         board = self.parent.board
         focus = board.current
@@ -63,6 +95,7 @@ class Control(tk.Frame):
             return
         board.enterCell( (focus[0]-1, focus[1]) )
 
+    @keystroke
     def arrowRight(self, event):
         board = self.parent.board
         focus = board.current
@@ -71,6 +104,7 @@ class Control(tk.Frame):
             return
         board.enterCell( (focus[0]+1, focus[1]) )
 
+    @keystroke
     def enterAnswer(self, event):
 
         # User enters an answer in a cell.
@@ -86,8 +120,8 @@ class Control(tk.Frame):
             return
         
         try:
-            update = puzzle.enterAnswer(cell, value)
-            board.postUpdate(update)
+            updates = puzzle.enterAnswer(cell, value)
+            board.postUpdate(updates)
             if puzzle.isCompleted():
                 self.parent.timer.stop()
                 board.celebrate()
@@ -96,6 +130,7 @@ class Control(tk.Frame):
         except:
             print('Error occurred')
 
+    @keystroke
     def toggleCandidate(self, event):
         # User toggles candidate in a cell.
         # If cell already has answer, there is no effect.
@@ -111,13 +146,15 @@ class Control(tk.Frame):
         if value > puzzle.dim:
             return
 
-        update = puzzle.toggleCandidate(cell, value)
-        board.postUpdate(update)
+        updates = puzzle.toggleCandidate(cell, value)
+        board.postUpdate(updates)
 
+    @keystroke
     def onClick(self, event):
         board = self.parent.board
         board.shiftFocus(event.x, event.y)
 
+    @keystroke
     def clearCell(self, event):
         # User types space bar
         # If candidates are displayed, clear all candidates for current cell.
@@ -128,16 +165,45 @@ class Control(tk.Frame):
         board  = self.parent.board
         cell   = board.current
 
-        update = puzzle.clearCell(cell)
-        board.postUpdate(update)
+        updates = puzzle.clearCell(cell)
+        board.postUpdate(updates)
 
+    @keystroke
     def rollBack(self, event):
-        update = self.parent.puzzle.undo()
-        self.parent.board.undo(update)
+        updates = self.parent.puzzle.undo()
+        self.parent.board.undo(updates)
 
+    @keystroke
     def rollForward(self, event):
-        update = self.parent.puzzle.redo()
-        self.parent.board.redo(update)
+        updates = self.parent.puzzle.redo()
+        self.parent.board.redo(updates)
+
+    @keystroke
+    def hint(self, event):
+        # User types h
+        # Show the easiest deduction that can be made next, or point
+        # out a wrong answer.  Nothing is entered on the board.
+
+        hint = self.parent.puzzle.hint()
+        if hint:
+            self.parent.board.showHint(hint)
+
+    def rendered(self, start):
+        # The board has been redrawn after the event handled at time
+        # start; see keystroke
+
+        timings.add('keystroke', time.perf_counter() - start)
+        self.parent.board.showLatency(timings.percentile('keystroke', 50),
+                                      timings.percentile('keystroke', 99))
+
+    def toggleInference(self, event):
+        # Switch automatic inferences on or off.
+        # When on, entering an answer removes it from the candidates
+        # in its row and column, and the consequences cascade.
+
+        parent = self.parent
+        parent.inference = not parent.inference
+        parent.puzzle.inference = parent.inference
 
     def map(self, event):
         timer = self.parent.timer
@@ -0,0 +1,188 @@
+'''
+Decoder for Simon Tatham's kenken ("keen") puzzle codes.
+
+A code looks like "6:a_a_7a__aa_3a...,s1m10a7...".  The part before the
+comma describes the cage walls, the part after it the clues, one per
+cage in order of the cages' first cells (reading down the columns of
+Tatham's grid, which is the transpose of ours).
+
+The wall code runs over the 2*dim*(dim-1) interior edges of the grid:
+a letter with index k in SYMBOLS joins k edges and is followed by one
+wall, and a number n repeats the previous letter n-1 more times.  The
+wall after the last letter is the edge of the grid, so the code must
+use up the edges exactly.  Any character that doesn't fit the format
+is an error.
+Cells joined by an edge are merged with union-find over flat indices
+x*dim + y.
+
+encode is the inverse of decode, for writing generated puzzles.
+
+This module doesn't depend on tkinter, so bulk tools (validation,
+rating, export) can use it directly.
+'''
+import re
+
+ADD = '+'
+SUB = '\u2212'
+MUL = '\xd7'
+DIV = '/'
+operation = [ADD, SUB, MUL, DIV]
+
+SYMBOLS = '_abcdefghijklm'
+RUNS = {c: k for k, c in enumerate(SYMBOLS)}
+WALLS = re.compile(r'[_a-m]|[0-9]+')
+CLUES = re.compile(r'([adms])([0-9]+)')
+WALLCODE = re.compile(r'(?:[_a-m][0-9]*)*')     # a whole wall code
+CLUECODE = re.compile(r'(?:[adms][0-9]+)*')     # a whole clue code
+OPS = {'a': ADD, 's': SUB, 'm': MUL, 'd': DIV}
+LETTERS = {op: c for c, op in OPS.items()}
+
+tableCache = {}          # dim -> (edges, cells, transposed order)
+
+
+class DecodeError(ValueError):
+    pass
+
+
+def tables(dim):
+    # For the given dim, return the (cell, cell) pair of each edge,
+    # the (x, y) pair of each flat index, and the flat indices in
+    # (y, x) order.  The tables are built on first use.
+
+    try:
+        return tableCache[dim]
+    except KeyError:
+        pass
+    edges = []
+    for e in range(dim*(dim-1)):              # edges between (x, y), (x+1, y)
+        y, x = divmod(e, dim-1)
+        edges.append((x*dim + y, (x+1)*dim + y))
+    for e in range(dim*(dim-1)):              # edges between (x, y-1), (x, y)
+        x, y = divmod(e, dim-1)
+        edges.append((x*dim + y, x*dim + y+1))
+    cells = [divmod(i, dim) for i in range(dim*dim)]
+    transposed = [x*dim + y for y in range(dim) for x in range(dim)]
+    tableCache[dim] = edges, cells, transposed
+    return tableCache[dim]
+
+
+def decode(code: str) -> list:
+    # Return a list of (op, value, cells) triples, one per cage in
+    # Tatham's order, where cells is a sorted list of (x, y) pairs.
+
+    try:
+        head, body = code.strip().split(':', 1)
+        dim = int(head)
+        wallCode, clueCode = body.split(',')
+    except ValueError:
+        raise DecodeError(f'malformed puzzle code {code!r}') from None
+    if not WALLCODE.fullmatch(wallCode):
+        raise DecodeError(f'bad character in wall code of {code!r}')
+    if not CLUECODE.fullmatch(clueCode):
+        raise DecodeError(f'bad character in clues of {code!r}')
+    edges, cells, transposed = tables(dim)
+
+    parent = list(range(dim*dim))
+    cursor = run = 0
+    for group in WALLS.findall(wallCode):
+        if group in RUNS:
+            run, repeat = RUNS[group], 1
+        else:
+            repeat = int(group) - 1
+        for _ in range(repeat):
+            if cursor + run > len(edges):
+                raise DecodeError(f'wall code too long in {code!r}')
+            for a, b in edges[cursor:cursor+run]:
+                while parent[a] != a:           # find, with path halving
+                    parent[a] = a = parent[parent[a]]
+                while parent[b] != b:
+                    parent[b] = b = parent[parent[b]]
+                if a < b:                       # the root is the least index
+                    parent[b] = a
+                elif b < a:
+                    parent[a] = b
+            cursor += run + 1
+    if cursor <= len(edges):
+        raise DecodeError(f'wall code too short in {code!r}')
+
+    # Point every cell at its root.  Since parent[i] <= i, the parent
+    # of i already points at its root when i is reached.
+    members = {}
+    for i, p in enumerate(parent):
+        r = parent[i] = parent[p]
+        if r in members:
+            members[r].append(cells[i])
+        else:
+            members[r] = [cells[i]]
+
+    clues = CLUES.findall(clueCode)
+    if len(clues) != len(members):
+        raise DecodeError(f'{len(members)} cages but {len(clues)} clues in {code!r}')
+    # Tatham numbers cages by their first cell in (y, x) order
+    order = dict.fromkeys([parent[i] for i in transposed])
+    return [(OPS[op], int(value), members[r]) for (op, value), r in zip(clues, order)]
+
+
+def decodeLines(lines, name='<lines>'):
+    # Generate (line number, code, cages) for each non-blank line of
+    # an iterable of puzzle codes.  A DecodeError names the line.
+
+    for lineno, line in enumerate(lines, 1):
+        code = line.strip()
+        if not code:
+            continue
+        try:
+            yield lineno, code, decode(code)
+        except DecodeError as e:
+            raise DecodeError(f'{name}:{lineno}: {e}') from None
+
+
+def decodeFile(path):
+    # Stream the decoded puzzles of a library file
+
+    with open(path) as fin:
+        yield from decodeLines(fin, path)
+
+
+def encode(dim: int, cages) -> str:
+    # Return the code of a puzzle given as (op, value, cells) triples,
+    # one per cage in any order, where cells are (x, y) pairs.
+    # Raise DecodeError if the walls can't be written in this format,
+    # which happens only if more than len(SYMBOLS)-1 edges in a row
+    # join cells of the same cage.
+
+    edges, cells, transposed = tables(dim)
+    cageOf = [None] * (dim*dim)
+    for k, (op, value, cageCells) in enumerate(cages):
+        for x, y in cageCells:
+            cageOf[x*dim + y] = k
+
+    symbols = []
+    run = 0
+    for a, b in edges:
+        if cageOf[a] == cageOf[b]:
+            run += 1
+        else:
+            if run >= len(SYMBOLS):
+                raise DecodeError(f'run of {run} edges without a wall')
+            symbols.append(SYMBOLS[run])
+            run = 0
+    if run >= len(SYMBOLS):
+        raise DecodeError(f'run of {run} edges without a wall')
+    symbols.append(SYMBOLS[run])     # the end of the code is a wall
+
+    # Like Tatham, write three or more of a symbol as the symbol and
+    # a count
+    wallCode = []
+    k = 0
+    while k < len(symbols):
+        j = k
+        while j < len(symbols) and symbols[j] == symbols[k]:
+            j += 1
+        wallCode.append(symbols[k] + str(j-k) if j-k > 2 else symbols[k] * (j-k))
+        k = j
+
+    # Tatham numbers cages by their first cell in (y, x) order
+    order = dict.fromkeys(cageOf[i] for i in transposed)
+    clues = ''.join(f'{LETTERS[cages[k][0]]}{cages[k][1]}' for k in order)
+    return f'{dim}:{"".join(wallCode)},{clues}'
@@ -19,8 +19,11 @@ class PopUp(simpledialog.Dialog):
             ('Easy', 'Normal', 'Hard', 'Extreme'), parent.difficulty)
         rb2 = self.RadioBox(frame, 'Dimension', 
             ('6', '7', '8', '9'), parent.dimension)
+        rb3 = self.RadioBox(frame, 'Rating',
+            ('Any', 'Easier', 'Typical', 'Harder'), parent.rating)
         rb1.grid(row = 0, column = 0)
         rb2.grid(row = 0, column = 1)
+        rb3.grid(row = 0, column = 2)
         return rb1
     
     def apply(self):
@@ -29,5 +32,6 @@ class PopUp(simpledialog.Dialog):
 root = tk.Tk()
 root.difficulty = tk.IntVar(root)
 root.dimension = tk.IntVar(root)
+root.rating = tk.IntVar(root)
 PopUp(root, 'Settings')
 root.mainloop()
\ No newline at end of file
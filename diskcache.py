@@ -0,0 +1,121 @@
+'''
+Small persistent LRU caches.
+
+A DiskCache keeps up to capacity entries in memory, most recently used
+last, and writes them to a pickle file in the user's cache directory
+($XDG_CACHE_HOME/kenken, or ~/.cache/kenken) when the program exits.
+The file is read on first use, or in a background thread started by
+preload, in which case the cache finds nothing until the file has been
+read.  A missing, unreadable or unwritable cache file just means
+starting empty; it is never an error.
+'''
+import atexit
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+
+def cachePath(name: str) -> str:
+    # Default location of the cache file called name
+
+    base = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'kenken', name)
+
+
+class DiskCache:
+    def __init__(self, name: str, capacity: int, path: str = None) -> None:
+        # name is the file name of the cache, capacity the most entries
+        # kept, and path the cache file, or None for the default location
+
+        self.capacity = capacity
+        self.path = path or cachePath(name)
+        self.entries = OrderedDict()
+        self.loaded = False
+        self.dirty = False
+        self.loader = None       # thread reading the file, after preload
+        self.fetched = None      # entries it read, until they are merged
+        atexit.register(self.save)
+
+    def read(self) -> list:
+        # The (key, entry) pairs of the disk cache, oldest first; none
+        # if there is no usable one
+
+        try:
+            with open(self.path, 'rb') as fin:
+                return pickle.load(fin)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+            return []
+
+    def fetch(self) -> None:
+        self.fetched = self.read()
+
+    def preload(self) -> None:
+        # Start reading the disk cache in the background
+
+        if not self.loaded and self.loader is None:
+            self.loader = threading.Thread(target=self.fetch, name='diskcache', daemon=True)
+            self.loader.start()
+
+    def load(self, wait: bool = True) -> None:
+        # Merge in the disk cache: read it now if preload wasn't
+        # called, else take what the background thread read, waiting
+        # for it only if wait is set.  Entries already in memory are
+        # newer, so they are kept, as the most recently used.
+
+        if self.loader is None:
+            entries = self.read()
+        else:
+            if wait:
+                self.loader.join()
+            if self.fetched is None:
+                return
+            entries, self.fetched = self.fetched, None
+        self.loaded = True
+        newer = self.entries
+        self.entries = OrderedDict(entries)
+        for key, entry in newer.items():
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+        self.trim()
+
+    def save(self) -> None:
+        # Write the entries to the disk cache.  Failure, e.g. on a
+        # read-only home directory, just leaves the cache as it was.
+
+        if not self.dirty:
+            return
+        if not self.loaded:
+            self.load()
+        temp = self.path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temp, 'wb') as fout:
+                pickle.dump(list(self.entries.items()), fout,
+                            pickle.HIGHEST_PROTOCOL)
+            os.replace(temp, self.path)
+            self.dirty = False
+        except OSError:
+            pass
+
+    def trim(self) -> None:
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)     # least recently used
+
+    def get(self, key, default=None):
+        if not self.loaded:
+            self.load(wait=False)
+        try:
+            self.entries.move_to_end(key)
+        except KeyError:
+            return default
+        return self.entries[key]
+
+    def put(self, key, entry) -> None:
+        if not self.loaded:
+            self.load(wait=False)
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        self.dirty = True
+        self.trim()
@@ -0,0 +1,290 @@
+#! /usr/bin/python3
+'''
+Generate puzzle libraries, replacing generate.sh and Tatham's keen.
+
+A puzzle is made by filling a random Latin square, cutting it into
+cages, and giving each cage an operation and the value its cells
+produce.  It is kept only if the solver finds exactly one solution,
+and only if it is as hard as its level asks for, measured by the
+hardest technique the grader needs to solve it (see grader.py):
+    easy            singles and cage arithmetic
+    normal          a naked pair
+    hard            a cage line or a naked triple
+    extreme         none of these: trial and error
+Easy puzzles have smaller cages and favor subtraction and division.
+The puzzles are written in Tatham's format (see decode.encode), one
+per line, to keys/{level}{dim}.txt.
+
+Puzzles are generated in parallel over a multiprocessing pool, and
+each file is written as its puzzles arrive, to a temporary file that
+replaces the library when it is complete.  With --append the puzzles
+are added to the end of the library instead.  A packed library
+(.kkb, see library.py) next to a library that was written is rebuilt,
+and the library is graded (see grader.py) to write its rating index.
+
+    python3 generate.py [--count N] [--levels LEVEL,...] [--dims DIM,...]
+                        [--jobs N] [--append] [--seed S] [--dir DIR]
+'''
+import argparse
+import os
+import random
+import sys
+import time
+from multiprocessing import Pool
+
+from decode import encode, DecodeError, ADD, SUB, MUL, DIV
+from puzzle import Cage
+from grader import grade, TRIAL
+from solver import Solver
+
+# For each level: relative frequencies of cage sizes, relative
+# frequencies of the operations of two-cell cages, and the allowed
+# range of the hardest technique needed (see grader.TECHNIQUES).
+LEVELS = {
+    'easy':    ({2: 86, 3: 12, 4: 2}, {SUB: 4, DIV: 4, ADD: 2, MUL: 2}, (3, 3)),
+    'normal':  ({2: 78, 3: 18, 4: 3, 5: 1}, {SUB: 3, DIV: 3, ADD: 3, MUL: 2}, (4, 4)),
+    'hard':    ({2: 78, 3: 18, 4: 3, 5: 1}, {SUB: 3, DIV: 3, ADD: 3, MUL: 2}, (5, 6)),
+    'extreme': ({2: 76, 3: 19, 4: 4, 5: 1}, {SUB: 3, DIV: 3, ADD: 3, MUL: 2}, (TRIAL, TRIAL)),
+}
+MAXMUL = 10**6           # largest product for a multiplication clue
+TRIES = 200              # cage layouts tried for each Latin square
+SQUARES = 200            # Latin squares tried before giving up
+# Smallest dimension each level can be made at: in a 3x3 puzzle a
+# hidden single always comes before a naked pair, and the ladder
+# never stalls
+SMALLEST = {'normal': 4, 'extreme': 4}
+
+
+class GenerateError(Exception):
+    pass
+
+
+def latinSquare(dim: int, rng) -> list:
+    # A random Latin square, as a list of values indexed by x*dim + y.
+    # Filled cell by cell with the values in random order,
+    # backtracking on a dead end.
+
+    size = dim * dim
+    full = ((1 << dim) - 1) << 1
+    rows = [0] * dim     # bitmask of the values used in each row
+    cols = [0] * dim
+    square = [0] * size
+    choices = [None] * size
+    i = 0
+    while i < size:
+        x, y = divmod(i, dim)
+        if choices[i] is None:
+            free = full & ~(rows[y] | cols[x])
+            values = [v for v in range(1, dim+1) if free >> v & 1]
+            rng.shuffle(values)
+            choices[i] = values
+        elif square[i]:
+            bit = 1 << square[i]       # undo the last choice
+            rows[y] ^= bit
+            cols[x] ^= bit
+            square[i] = 0
+        if choices[i]:
+            v = square[i] = choices[i].pop()
+            rows[y] |= 1 << v
+            cols[x] |= 1 << v
+            i += 1
+        else:
+            choices[i] = None          # dead end: back up
+            i -= 1
+    return square
+
+
+def partition(dim: int, sizes: dict, rng) -> list:
+    # Cut the grid into cages, as lists of flat indices.  Each cage is
+    # grown from a random free cell to a size drawn from sizes, by
+    # adding random free neighbors.  A cell left on its own is merged
+    # into a neighboring cage.
+
+    size = dim * dim
+    cageOf = [-1] * size
+    cages = []
+    population, weights = list(sizes), list(sizes.values())
+
+    def neighbors(i):
+        x, y = divmod(i, dim)
+        if x > 0:
+            yield i - dim
+        if x < dim-1:
+            yield i + dim
+        if y > 0:
+            yield i - 1
+        if y < dim-1:
+            yield i + 1
+
+    order = list(range(size))
+    rng.shuffle(order)
+    for start in order:
+        if cageOf[start] >= 0:
+            continue
+        target = rng.choices(population, weights)[0]
+        cage = [start]
+        cageOf[start] = len(cages)
+        while len(cage) < target:
+            free = [j for i in cage for j in neighbors(i) if cageOf[j] < 0]
+            if not free:
+                break
+            j = rng.choice(free)
+            cageOf[j] = len(cages)
+            cage.append(j)
+        cages.append(cage)
+
+    for k, cage in enumerate(cages):
+        if len(cage) == 1:
+            i = cage[0]
+            other = min((cageOf[j] for j in neighbors(i)), key=lambda c: len(cages[c]))
+            cages[other].append(i)
+            cageOf[i] = other
+            cage.clear()
+    return [cage for cage in cages if cage]
+
+
+def clue(values: list, ops2: dict, rng) -> tuple:
+    # (op, value) for a cage whose cells hold values
+
+    if len(values) == 2:
+        big, small = max(values), min(values)
+        ops = [op for op in ops2 if op != DIV or big % small == 0]
+        op = rng.choices(ops, [ops2[op] for op in ops])[0]
+    else:
+        product = 1
+        for v in values:
+            product *= v
+        op = rng.choice((ADD, MUL)) if product <= MAXMUL else ADD
+    if op == ADD:
+        return op, sum(values)
+    if op == MUL:
+        product = 1
+        for v in values:
+            product *= v
+        return op, product
+    if op == SUB:
+        return op, big - small
+    return op, big // small
+
+
+def generatePuzzle(task) -> tuple:
+    # Make a new puzzle for task, which is (level, dim, seed).
+    # Return (level, dim, code).  Raise GenerateError if none is
+    # found in SQUARES Latin squares.
+
+    level, dim, seed = task
+    sizes, ops2, (easiest, hardest) = LEVELS[level]
+    rng = random.Random(seed)
+    for _ in range(SQUARES):
+        square = latinSquare(dim, rng)
+        for _ in range(TRIES):
+            cages = []
+            for cells in partition(dim, sizes, rng):
+                op, value = clue([square[i] for i in cells], ops2, rng)
+                cages.append(Cage(op, value, [divmod(i, dim) for i in cells]))
+            solver = Solver(dim, cages)
+            if solver.countSolutions(2) != 1:
+                continue
+            if not easiest <= grade(dim, cages)[0] <= hardest:
+                continue
+            try:
+                return level, dim, encode(dim, [(cage.op, cage.value, cage) for cage in cages])
+            except DecodeError:
+                continue
+    raise GenerateError(f'no {level} puzzle of dimension {dim} found '
+                        f'in {SQUARES * TRIES} tries')
+
+
+def generate(counts: dict, directory='keys', jobs=None, append=False,
+             seed=None, out=sys.stderr) -> None:
+    # Generate counts[level, dim] puzzles for each library, writing
+    # each as it arrives, and report progress to out
+
+    from library import pack
+    from grader import rate
+
+    jobs = jobs or os.cpu_count() or 1
+    rng = random.Random(seed)
+    work = [(level, dim, rng.getrandbits(64))
+            for (level, dim), count in counts.items() for _ in range(count)]
+    rng.shuffle(work)                # spread the slow levels over the run
+    remaining = dict(counts)
+    files = {}
+    for level, dim in counts:
+        path = os.path.join(directory, f'{level}{dim}.txt')
+        files[level, dim] = path, open(path if append else path + '.tmp',
+                                       'a' if append else 'w')
+    pool = Pool(jobs) if jobs > 1 else None
+    start = time.perf_counter()
+    try:
+        if pool:
+            results = pool.imap_unordered(generatePuzzle, work)
+        else:
+            results = map(generatePuzzle, work)
+        for done, (level, dim, code) in enumerate(results, 1):
+            path, fout = files[level, dim]
+            fout.write(code + '\n')
+            fout.flush()
+            remaining[level, dim] -= 1
+            if remaining[level, dim]:
+                continue
+            fout.close()
+            if not append:
+                os.replace(path + '.tmp', path)
+            packed = os.path.splitext(path)[0] + '.kkb'
+            if os.path.exists(packed):
+                pack(path, packed)
+            rate(path)
+            elapsed = time.perf_counter() - start
+            print(f'{path}: {counts[level, dim]} puzzles '
+                  f'({done}/{len(work)} in {elapsed:.1f} s)', file=out, flush=True)
+    finally:
+        if pool:
+            pool.terminate()
+        for path, fout in files.values():
+            if not fout.closed:
+                fout.close()
+                if not append:
+                    os.remove(path + '.tmp')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate puzzle libraries.')
+    parser.add_argument('--count', '-n', type=int, default=100,
+                        help='puzzles per library (default %(default)s)')
+    parser.add_argument('--levels', default=','.join(LEVELS),
+                        help='comma-separated levels (default all)')
+    parser.add_argument('--dims', default='6,7,8,9',
+                        help='comma-separated dimensions (default %(default)s)')
+    parser.add_argument('--jobs', '-j', type=int, default=0,
+                        help='worker processes (default one per CPU)')
+    parser.add_argument('--append', action='store_true',
+                        help='add to the libraries instead of replacing them')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='random seed, for a repeatable run')
+    parser.add_argument('--dir', default='keys',
+                        help='directory of the libraries (default %(default)s)')
+    args = parser.parse_args()
+
+    levels = args.levels.split(',')
+    for level in levels:
+        if level not in LEVELS:
+            parser.error(f'unknown level {level!r}')
+    dims = [int(d) for d in args.dims.split(',')]
+    for dim in dims:
+        if not 3 <= dim <= 9:
+            parser.error(f'dimension {dim} is not between 3 and 9')
+        for level in levels:
+            if dim < SMALLEST.get(level, 3):
+                parser.error(f'{level} puzzles need a dimension of at least {SMALLEST[level]}')
+    counts = {(level, dim): args.count for level in levels for dim in dims}
+    try:
+        generate(counts, args.dir, args.jobs, args.append, args.seed)
+    except GenerateError as e:
+        print(f'{sys.argv[0]}: {e}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
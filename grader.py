@@ -0,0 +1,290 @@
+#! /usr/bin/python3
+'''
+Difficulty grading by a ladder of human solving techniques.
+
+A puzzle is solved the way a person would: at each step the easiest
+technique that makes progress is used, and the puzzle is rated by the
+hardest technique it needed and the number of steps it took.  The
+techniques, easiest first, are
+    1 naked single     a cell has one candidate left, so it is that
+                       value, and the value is removed from its row
+                       and column
+    2 hidden single    a value has only one place left in a row or
+                       column
+    3 cage arithmetic  a candidate takes part in no combination of
+                       values that meets its cage's clue
+    4 naked pair       two cells of a row or column have the same two
+                       candidates, which go nowhere else in it
+    5 cage line        every combination of a cage puts a value in the
+                       cage's cells in one row or column, so it goes
+                       nowhere else in it
+    6 naked triple     as a pair, with three cells and three values
+    7 trial            none of the above applies; a cell is given its
+                       value from the solution, as if by trial and error
+
+Candidates are kept as bitmasks, as in solver.py.  A technique only
+needs to look again at the cells, rows, columns and cages whose
+candidates have changed since it last found nothing there, so each
+step is cheap, and the same ladder serves for hints on a puzzle in
+progress (see Puzzle.hint).
+
+Run this module to grade the libraries in keys/, writing a rating
+index next to each (see library.writeRatings).
+'''
+from collections import namedtuple
+from itertools import combinations
+
+from solver import Solver
+
+TECHNIQUES = ('naked single', 'hidden single', 'cage arithmetic',
+              'naked pair', 'cage line', 'naked triple', 'trial')
+TRIAL = len(TECHNIQUES)      # level of the last resort
+
+# A deduction: the level of its technique (1 is easiest), the cells
+# it is based on, the candidates it removes as {cell: bitmask}, and
+# for a single the cell and value placed (else -1 and 0).  Cells are
+# flat indices x*dim + y.
+Step = namedtuple('Step', 'level cells removals cell value')
+
+
+class Ladder:
+    def __init__(self, solver: Solver) -> None:
+        # solver supplies the structure of the puzzle: its units,
+        # cages and the value tuples of each cage
+
+        self.solver = solver
+        n = solver.size
+        self.dom = [solver.full] * n
+        self.tuples = list(solver.tuples)
+        self.placed = [False] * n
+        self.left = n            # cells not placed
+        # the items each technique must look at again
+        units = range(len(solver.units))
+        cages = range(len(solver.cageCells))
+        self.dirty = {'cells': set(range(n)), 'singles': set(units),
+                      'arithmetic': set(cages), 'pairs': set(units),
+                      'lines': set(cages), 'triples': set(units)}
+
+    def restrict(self, i: int, mask: int) -> None:
+        # Keep only the candidates of cell i in mask
+
+        new = self.dom[i] & mask
+        if new != self.dom[i]:
+            self.dom[i] = new
+            dirty = self.dirty
+            dirty['cells'].add(i)
+            row, col = self.solver.unitsOf[i]
+            for name in ('singles', 'pairs', 'triples'):
+                dirty[name].add(row)
+                dirty[name].add(col)
+            cage = self.solver.cageOf[i]
+            dirty['arithmetic'].add(cage)
+            dirty['lines'].add(cage)
+
+    def place(self, i: int, value: int) -> None:
+        # Cell i is value: remove it from the rest of the row and column
+
+        bit = 1 << value
+        self.restrict(i, bit)
+        if not self.placed[i]:
+            self.placed[i] = True
+            self.left -= 1
+        for p in self.solver.peers[i]:
+            self.restrict(p, ~bit)
+
+    def apply(self, step: Step) -> None:
+        for i, mask in step.removals.items():
+            self.restrict(i, ~mask)
+        if step.cell >= 0:
+            self.place(step.cell, step.value)
+
+    def solved(self) -> bool:
+        return not self.left
+
+    def nakedSingle(self):
+        dom, placed = self.dom, self.placed
+        for i in sorted(self.dirty['cells']):
+            d = dom[i]
+            if not placed[i] and d and not d & (d-1):
+                value = d.bit_length() - 1
+                return Step(1, (i,), {}, i, value)
+        self.dirty['cells'].clear()
+
+    def hiddenSingle(self):
+        dom, placed, units = self.dom, self.placed, self.solver.units
+        for u in sorted(self.dirty['singles']):
+            once = twice = 0
+            for c in units[u]:
+                d = dom[c]
+                twice |= once & d
+                once |= d
+            hidden = once & ~twice
+            for c in units[u]:
+                d = dom[c] & hidden
+                if d and not placed[c] and d != dom[c]:
+                    value = d.bit_length() - 1
+                    return Step(2, tuple(units[u]), {}, c, value)
+        self.dirty['singles'].clear()
+
+    def cageArithmetic(self):
+        dom, tuples = self.dom, self.tuples
+        cageCells = self.solver.cageCells
+        for k in sorted(self.dirty['arithmetic']):
+            cells = cageCells[k]
+            doms = [dom[c] for c in cells]
+            ts = tuples[k] = [t for t in tuples[k]
+                              if all(d >> v & 1 for d, v in zip(doms, t))]
+            removals = {}
+            for j, c in enumerate(cells):
+                support = 0
+                for t in ts:
+                    support |= 1 << t[j]
+                if doms[j] & ~support:
+                    removals[c] = doms[j] & ~support
+            if removals:
+                return Step(3, tuple(cells), removals, -1, 0)
+        self.dirty['arithmetic'].clear()
+
+    def nakedSubset(self, size: int, level: int, name: str):
+        dom, placed, units = self.dom, self.placed, self.solver.units
+        for u in sorted(self.dirty[name]):
+            open = [c for c in units[u] if not placed[c]]
+            small = [c for c in open if 1 < dom[c].bit_count() <= size]
+            for group in combinations(small, size):
+                values = 0
+                for c in group:
+                    values |= dom[c]
+                if values.bit_count() != size:
+                    continue
+                removals = {c: dom[c] & values for c in open
+                            if c not in group and dom[c] & values}
+                if removals:
+                    return Step(level, group, removals, -1, 0)
+        self.dirty[name].clear()
+
+    def nakedPair(self):
+        return self.nakedSubset(2, 4, 'pairs')
+
+    def nakedTriple(self):
+        return self.nakedSubset(3, 6, 'triples')
+
+    def cageLine(self):
+        solver, dom = self.solver, self.dom
+        for k in sorted(self.dirty['lines']):
+            cells = solver.cageCells[k]
+            if len(cells) < 2:
+                continue
+            # positions of the cage's cells in each row and column
+            lines = {}
+            for j, c in enumerate(cells):
+                for u in solver.unitsOf[c]:
+                    lines.setdefault(u, []).append(j)
+            for u, positions in sorted(lines.items()):
+                if len(positions) < 2:
+                    continue
+                required = solver.full
+                for t in self.tuples[k]:
+                    used = 0
+                    for j in positions:
+                        used |= 1 << t[j]
+                    required &= used
+                    if not required:
+                        break
+                if not required:
+                    continue
+                removals = {c: dom[c] & required for c in solver.units[u]
+                            if c not in cells and dom[c] & required}
+                if removals:
+                    return Step(5, tuple(cells), removals, -1, 0)
+        self.dirty['lines'].clear()
+
+    def next(self):
+        # The easiest deduction available, or None if there is none.
+        # Cage arithmetic is brought up to date before the techniques
+        # that use the cages' tuples.
+
+        for technique in (self.nakedSingle, self.hiddenSingle,
+                          self.cageArithmetic, self.nakedPair,
+                          self.cageLine, self.nakedTriple):
+            step = technique()
+            if step:
+                return step
+        return None
+
+    def trial(self, solution: list) -> Step:
+        # Last resort: give the open cell with fewest candidates its
+        # value from solution
+
+        dom, placed = self.dom, self.placed
+        i = min((c for c in range(len(dom)) if not placed[c]),
+                key=lambda c: dom[c].bit_count())
+        return Step(TRIAL, (i,), {}, i, solution[i])
+
+
+def grade(dim: int, cages) -> tuple:
+    # Rate a puzzle.  cages are as for Solver.  Return the level of
+    # the hardest technique needed (see TECHNIQUES) and the number of
+    # steps taken.
+
+    solver = Solver(dim, cages)
+    ladder = Ladder(solver)
+    hardest = steps = 0
+    solution = None
+    while not ladder.solved():
+        step = ladder.next()
+        if step is None:
+            if solution is None:
+                solution = solver.solve()
+            step = ladder.trial(solution)
+        ladder.apply(step)
+        hardest = max(hardest, step.level)
+        steps += 1
+    return hardest, steps
+
+
+def gradeCode(code: str) -> tuple:
+    from decode import decode
+    from puzzle import Cage
+
+    dim = int(code.split(':')[0])
+    return grade(dim, [Cage(op, value, cells) for op, value, cells in decode(code)])
+
+
+def rate(path: str, pool=None) -> list:
+    # Grade every puzzle of the text library at path, over pool if
+    # given, and write its rating index.  Return the ratings.
+
+    from library import writeRatings
+
+    with open(path) as fin:
+        codes = [line.strip() for line in fin if line.strip()]
+    ratings = pool.map(gradeCode, codes, 16) if pool else list(map(gradeCode, codes))
+    writeRatings(path, ratings)
+    return ratings
+
+
+def main():
+    # Grade every library in keys/ and write its rating index
+
+    import glob
+    import os
+    import sys
+    from collections import Counter
+    from multiprocessing import Pool
+
+    jobs = os.cpu_count() or 1
+    pool = Pool(jobs) if jobs > 1 else None
+    try:
+        for path in sorted(glob.glob('keys/*.txt')):
+            ratings = rate(path, pool)
+            levels = Counter(level for level, _ in ratings)
+            spread = ', '.join(f'{levels[level]} {TECHNIQUES[level-1]}'
+                               for level in sorted(levels))
+            print(f'{path}: {len(ratings)} puzzles ({spread})', file=sys.stderr)
+    finally:
+        if pool:
+            pool.terminate()
+
+
+if __name__ == '__main__':
+    main()
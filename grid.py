@@ -0,0 +1,146 @@
+'''
+Compact model of the user's entries in a puzzle grid.
+
+Cell (x, y) has flat index x*dim + y.  Answers are kept in a byte
+array (0 means no answer), and the candidates of each cell are a
+single int bitmask in which bit v is set iff v is a candidate.
+
+Each row and column also keeps an occupancy bitmask of the answers
+it holds, and a table mapping each value to the cell holding it, so
+that conflicts are found in constant time.  Similarly each cage keeps
+the number of its cells that are filled and the running sum and
+product of their answers, and the grid keeps its total of filled
+cells.  Answers must therefore be changed only through setAnswer.
+'''
+from array import array
+from collections import namedtuple
+
+Update = namedtuple('Update', ['coords', 'answer', 'candidates'])
+makeUpdate = tuple.__new__      # makeUpdate(Update, fields) skips argument parsing
+
+# Memo of candidate bitmask -> tuple of the values it holds.
+# The mapping doesn't depend on dim, so it is shared by all grids.
+maskValues = {}
+
+
+class Grid:
+    __slots__ = ('dim', 'size', 'answer', 'cands',
+                 'rowMask', 'colMask', 'rowCell', 'colCell',
+                 'cageOf', 'cageFilled', 'cageSum', 'cageProd', 'filled',
+                 'coords')
+
+    def __init__(self, dim: int) -> None:
+        self.dim = dim
+        self.size = dim * dim
+        self.answer = array('B', bytes(self.size))
+        self.cands = array('L', [0]) * self.size
+        # rowMask[y] has bit v set iff v is an answer in row y, and
+        # rowCell[y*(dim+1) + v] is then the index of its cell.
+        # Likewise for columns, indexed by x.
+        self.rowMask = array('L', [0]) * dim
+        self.colMask = array('L', [0]) * dim
+        self.rowCell = array('L', [0]) * (dim * (dim+1))
+        self.colCell = array('L', [0]) * (dim * (dim+1))
+        # cage counters, sized by setCages
+        self.cageOf = array('L', [0]) * self.size
+        self.cageFilled = []
+        self.cageSum = []
+        self.cageProd = []
+        self.filled = 0
+        self.coords = [divmod(i, dim) for i in range(self.size)]   # (x, y) by index
+
+    def setCages(self, cages) -> None:
+        # cages is a list of lists of flat indices.  Cage k of the
+        # list is numbered k in cageOf and the counters.
+
+        for k, cells in enumerate(cages):
+            for i in cells:
+                self.cageOf[i] = k
+        n = len(cages)
+        self.cageFilled = [0] * n
+        self.cageSum = [0] * n
+        self.cageProd = [1] * n
+
+    def index(self, cell) -> int:
+        return cell[0] * self.dim + cell[1]
+
+    def cell(self, index: int) -> tuple:
+        return divmod(index, self.dim)
+
+    def candidates(self, index: int) -> tuple:
+        # Candidate values of a cell in increasing order
+
+        mask = self.cands[index]
+        try:
+            return maskValues[mask]
+        except KeyError:
+            values = maskValues[mask] = tuple(
+                v for v in range(1, mask.bit_length()) if mask >> v & 1)
+            return values
+
+    def update(self, index: int) -> Update:
+        # Record of the current contents of a cell, for posting on the view
+
+        values = maskValues.get(self.cands[index])
+        if values is None:
+            values = self.candidates(index)
+        return makeUpdate(Update, (self.coords[index], self.answer[index], values))
+
+    def setAnswer(self, index: int, value: int) -> None:
+        # Enter value (0 to erase) as the answer in a cell,
+        # keeping the row and column occupancy up to date
+
+        old = self.answer[index]
+        if old == value:
+            return
+        x, y = divmod(index, self.dim)
+        slot = self.dim + 1
+        k = self.cageOf[index]
+        if old:
+            self.rowMask[y] &= ~(1 << old)
+            self.colMask[x] &= ~(1 << old)
+            self.cageFilled[k] -= 1
+            self.cageSum[k] -= old
+            self.cageProd[k] //= old
+            self.filled -= 1
+        if value:
+            self.rowMask[y] |= 1 << value
+            self.colMask[x] |= 1 << value
+            self.rowCell[y*slot + value] = index
+            self.colCell[x*slot + value] = index
+            self.cageFilled[k] += 1
+            self.cageSum[k] += value
+            self.cageProd[k] *= value
+            self.filled += 1
+        self.answer[index] = value
+
+    def conflicts(self, index: int, value: int) -> list:
+        # Indices of the cells in the row or column of the given cell
+        # that already hold value as an answer
+
+        x, y = divmod(index, self.dim)
+        slot = self.dim + 1
+        bit = 1 << value
+        cells = []
+        if self.rowMask[y] & bit:
+            cells.append(self.rowCell[y*slot + value])
+        if self.colMask[x] & bit:
+            cells.append(self.colCell[x*slot + value])
+        return [c for c in cells if c != index]
+
+    def isEmpty(self, index: int) -> bool:
+        return not (self.answer[index] or self.cands[index])
+
+    def clear(self) -> None:
+        # Erase all answers and candidates, in place
+
+        size, dim = self.size, self.dim
+        self.answer[:] = array('B', bytes(size))
+        self.cands[:] = array('L', [0]) * size
+        self.rowMask[:] = array('L', [0]) * dim
+        self.colMask[:] = array('L', [0]) * dim
+        n = len(self.cageFilled)
+        self.cageFilled = [0] * n
+        self.cageSum = [0] * n
+        self.cageProd = [1] * n
+        self.filled = 0
@@ -0,0 +1,110 @@
+'''
+Undo/redo journal for a puzzle.
+
+The journal is a sequence of transactions, each a group of cell
+changes that is undone and redone as a unit.  Changes are packed four
+to a record in a single array:
+    flat cell index, answers (before << 8 | after),
+    candidates before, candidates after
+and starts holds the offset of each transaction's first record.
+Transactions [0, top) are done and can be undone; those from top on
+have been undone and can be redone.  Starting a new transaction
+discards the redo part.
+
+If limit is set, the journal holds at most about that many changes.
+When it grows past the limit the oldest transactions are dropped a
+batch at a time, so long sessions stay within a fixed amount of
+memory; they can no longer be undone.
+'''
+from array import array
+
+RECORD = 4                # array entries per change
+
+
+class Journal:
+    __slots__ = ('deltas', 'starts', 'top', 'limit')
+
+    def __init__(self, limit: int = 0) -> None:
+        # limit is the most changes kept, 0 for no limit
+
+        self.limit = limit
+        self.clear()
+
+    def clear(self) -> None:
+        self.deltas = array('I')
+        self.starts = array('I')
+        self.top = 0
+
+    def __len__(self) -> int:
+        # number of transactions that can be undone
+        return self.top
+
+    def begin(self) -> None:
+        # Start a transaction, discarding anything that could be redone
+
+        top, starts = self.top, self.starts
+        if top < len(starts):
+            del self.deltas[starts[top]:]
+            del starts[top:]
+        starts.append(len(self.deltas))
+
+    def record(self, index, bAnswer, bCands, aAnswer, aCands) -> None:
+        # Add the change of one cell to the current transaction
+
+        self.deltas.extend((index, bAnswer << 8 | aAnswer, bCands, aCands))
+
+    def end(self) -> list:
+        # Close the current transaction.  Return the indices of the
+        # cells it changed, in order of first change.
+
+        start = self.starts[-1]
+        if start == len(self.deltas):          # nothing changed
+            self.starts.pop()
+            return []
+        self.top += 1
+        if len(self.deltas) - start == RECORD:
+            cells = [self.deltas[start]]
+        else:
+            cells = list(dict.fromkeys(self.deltas[start::RECORD]))
+        if self.limit and len(self.deltas) > self.limit * RECORD:
+            self.trim()
+        return cells
+
+    def undo(self):
+        # Step back over the last transaction done and return its span
+        # (offsets in deltas of its first record and of the end of its
+        # last), or None if there is nothing to undo
+
+        top = self.top
+        if not top:
+            return None
+        starts = self.starts
+        self.top = top = top - 1
+        return starts[top], starts[top+1] if top+1 < len(starts) else len(self.deltas)
+
+    def redo(self):
+        # Step forward over the next transaction undone and return its
+        # span, or None if there is nothing to redo
+
+        top, starts = self.top, self.starts
+        if top == len(starts):
+            return None
+        self.top = top + 1
+        return starts[top], starts[top+1] if top+1 < len(starts) else len(self.deltas)
+
+    def trim(self) -> None:
+        # Drop the oldest done transactions until the journal is down
+        # to three quarters of its limit
+
+        goal = len(self.deltas) - self.limit * RECORD * 3 // 4
+        drop = 0
+        while drop < self.top - 1 and self.starts[drop] < goal:
+            drop += 1
+        if not drop:
+            return
+        offset = self.starts[drop]
+        del self.deltas[:offset]
+        del self.starts[:drop]
+        for t in range(len(self.starts)):
+            self.starts[t] -= offset
+        self.top -= drop
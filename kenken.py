@@ -2,7 +2,7 @@
 ''' Graphic user interface for kenken puzzle. 
 '''
 import tkinter as tk
-import linecache
+import os
 from tkinter import filedialog
 from random import randrange
 
@@ -11,6 +11,13 @@ from board     import Board
 from puzzle import Puzzle
 from stopwatch import StopWatch
 from dialogs import PopUp
+from library import Library, PackedLibrary, Ratings, isCurrent
+from metrics import metrics
+from coloring import colorings
+
+# Most changes kept by the undo journal of a puzzle (see journal.py);
+# set KENKEN_JOURNAL_LIMIT to change it, 0 for no limit
+JOURNALLIMIT = int(os.environ.get('KENKEN_JOURNAL_LIMIT', 65536))
                                       
 class KenKen(tk.Frame):             
     def __init__(self, win):
@@ -22,30 +29,41 @@ class KenKen(tk.Frame):
         win.resizable(False, False)   
         self.difficulty = tk.IntVar(self)  # used in the Settings dialog 
         self.dimension = tk.IntVar(self)
+        self.rating = tk.IntVar(self)      # 0 for any, else a third of the library by rating
         self.difficulty.set(0)
         self.dimension.set(0)
+        self.rating.set(0)
         self.levels = 'easy', 'normal', 'hard', 'extreme'
+        self.inference = False    # automatic inferences, toggled by Control
         self.control = Control(self, win)
                      
         self.timer = StopWatch(win)
         self.timer.pack()
+        self.board = Board(self, win)   # one board, reused for every puzzle
         self.board.pack(side = tk.TOP, expand=tk.YES, fill=tk.BOTH)
-        self.fileSizes = self.getFileSizes()
+        self.libraries = self.getLibraries()
+        self.ratings = {key: Ratings(f'keys/{key[0]}{key[1]}.txt') for key in self.libraries}
+        # Read the coloring cache in the background; until it is in,
+        # puzzles are colored from scratch
+        colorings.preload()
         self.grid()
         self.newPuzzle()  # sets self.puzzle
         self.settings = PopUp(self)
 
     def newPuzzle(self):
-        diff = self.difficulty.get()
-        dim = self.dimension.get()
-        self.board = Board(self, self.win, dim = dim, height = height, width = width, bg = bg, cursor=cursor)
-        fn = f'keys/{diff}{dim}.txt'
-        size = self.fileSizes[diff, dim]
-        idx = randrange(size)
-        code = linecache.getline(fn, idx)
-        with open('code.txt', 'w') as fin:
-            fin.write(code)
-        self.puzzleFromCode(code)
+        diff = self.levels[self.difficulty.get()]
+        dim = 6 + self.dimension.get()
+        library = self.libraries[diff, dim]
+        # Pick by rating (see grader.py) if the library has been graded
+        band, ratings = self.rating.get(), self.ratings[diff, dim]
+        if band and len(ratings) == len(library):
+            n = ratings.pick((band-1) / 3, band / 3)
+            rating = ratings.rating(n)
+        else:
+            n, rating = randrange(len(library)), None
+        code, decoded = library.record(n)
+        metrics.record('puzzle', difficulty=diff, dim=dim, code=code, rating=rating)
+        self.puzzleFromCode(code, decoded)
         
     def openPuzzle(self):
         fn = filedialog.askopenfilename(parent=self.win,
@@ -57,21 +75,26 @@ class KenKen(tk.Frame):
         code = open(fn).read()
         self.puzzleFromCode(code)
         
-    def puzzleFromCode(self, code):
-        dim = int(code[0])
-        self.puzzle = Puzzle(self, code)
-        self.board.draw(dim)
+    def puzzleFromCode(self, code, decoded=None):
+        self.puzzle = Puzzle(self, code, decoded, JOURNALLIMIT)
+        self.puzzle.inference = self.inference
+        self.board.load(self.puzzle)
+        self.board.after_idle(self.puzzle.prepareHints)
         self.timer.start()
 
-    def getFileSizes(self):
-        sizes = {}
+    def getLibraries(self):
+        # Libraries open their offset indexes lazily, on first use.
+        # Prefer a packed library (see library.py) where one exists
+        # and was made from the text library as it is now.
+        libraries = {}
         for diff in self.levels:
             for dim in range(6,10):
-                with open(f'keys/{diff}{dim}.txt') as fin:
-                    for count, _ in enumerate(fin):
-                        pass
-                sizes[diff,dim] = count+1
-        return sizes
+                packed = f'keys/{diff}{dim}.kkb'
+                if os.path.exists(packed) and isCurrent(packed, f'keys/{diff}{dim}.txt'):
+                    libraries[diff,dim] = PackedLibrary(packed)
+                else:
+                    libraries[diff,dim] = Library(f'keys/{diff}{dim}.txt')
+        return libraries
 
 def main():
     root = tk.Tk()
@@ -0,0 +1,405 @@
+'''
+Random access to the puzzle libraries in keys/.
+
+Each library file keys/{difficulty}{dim}.txt holds one puzzle code per
+line.  Alongside it we keep a sidecar index, keys/{difficulty}{dim}.idx,
+holding the byte offset of every line, so that puzzle n can be fetched
+with a single seek and read.  The index is built once and reused until
+the library file's mtime or size changes.
+
+Index layout (little-endian):
+    header  magic b'KKIDX\\0\\0\\1', mtime_ns, size, count   (4 x 8 bytes)
+    body    count+1 offsets, 8 bytes each; the last is the end of the
+            final line
+
+Packed binary libraries, keys/{difficulty}{dim}.kkb, hold the same
+puzzles with their cages already decoded.  Records are grouped into
+blocks of BLOCK puzzles, each block compressed with zlib, and the file
+is read through mmap, so fetching a puzzle costs one block
+decompression no matter how large the library is.  Run this module
+to convert the text libraries in keys/ to packed ones.  The header
+records the mtime and size of the text library it was made from, and
+a packed library is only used while the text library is unchanged
+(see isCurrent).
+
+Packed layout (little-endian):
+    header  magic b'KKPACK\\0\\2', count, block size, block count,
+            offset of the block index, source mtime_ns, source size
+                                                     (8+8+4+4+8+8+8 bytes)
+    blocks  zlib data; decompressed, a block is a table of record
+            offsets (4 bytes each, relative to the end of the table)
+            followed by the records
+    index   block count entries of (offset, compressed length)
+A record is
+    code length (2), code (ascii), cage count (2), and per cage:
+    operation (1: index into puzzle.operation), target (4),
+    cell count (1), cells (2 each: flat index x*dim + y)
+
+A rating index, keys/{difficulty}{dim}.rat, holds the grade of every
+puzzle (see grader.py) and the puzzle numbers in order of rating, so
+that a puzzle of a given rating can be picked with a single seek and
+read.  It is written by the grader, never at load time, and like the
+offset index it is only used while the library file is unchanged.
+
+Rating layout (little-endian):
+    header  magic b'KKRATE\\0\\1', mtime_ns, size, count  (4 x 8 bytes)
+    body    count hardest technique levels, 1 byte each;
+            count step counts, 2 bytes each;
+            count puzzle numbers sorted by (level, steps), 4 bytes each
+'''
+import os
+import mmap
+import random
+import struct
+import zlib
+from array import array
+
+from decode import decodeLines, operation
+
+MAGIC = b'KKIDX\0\0\1'
+HEADER = struct.Struct('<8sQQQ')
+OFFSET = struct.Struct('<QQ')
+CHUNK = 1 << 16          # offsets buffered while building an index
+
+PACKMAGIC = b'KKPACK\0\2'
+PACKHEADER = struct.Struct('<8sQIIQQQ')
+BLOCKENTRY = struct.Struct('<QI')
+BLOCK = 64               # puzzles per compressed block
+
+RATEMAGIC = b'KKRATE\0\1'
+RANK = struct.Struct('<I')
+
+
+class Library:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.indexPath = os.path.splitext(path)[0] + '.idx'
+        self.count = None        # number of puzzles, once the index is open
+        self.offsets = None      # in-memory index, if the sidecar can't be written
+        self.lib = None          # open file objects
+        self.idx = None
+
+    def open(self) -> None:
+        # Validate the sidecar index against the library file,
+        # rebuilding it if it is missing or stale.
+
+        stat = os.stat(self.path)
+        try:
+            with open(self.indexPath, 'rb') as fin:
+                magic, mtime, size, count = HEADER.unpack(fin.read(HEADER.size))
+            if (magic, mtime, size) != (MAGIC, stat.st_mtime_ns, stat.st_size):
+                raise ValueError('stale index')
+        except (OSError, ValueError, struct.error):
+            count = self.build(stat)
+        self.count = count
+        self.lib = open(self.path, 'rb')
+        if self.offsets is None:
+            self.idx = open(self.indexPath, 'rb')
+
+    def build(self, stat) -> int:
+        # Scan the library once, writing line offsets to the sidecar.
+        # Blank lines are skipped.  If the index can't be written
+        # (e.g. a read-only install) keep the offsets in memory instead.
+
+        temp = self.indexPath + '.tmp'
+        offsets = array('Q')
+        count = 0
+        try:
+            fout = open(temp, 'wb')
+        except OSError:
+            fout = None
+        with open(self.path, 'rb') as fin:
+            if fout:
+                fout.write(HEADER.pack(MAGIC, 0, 0, 0))
+            pos = 0
+            for line in fin:
+                if line.strip():
+                    offsets.append(pos)
+                    count += 1
+                    if fout and len(offsets) >= CHUNK:
+                        offsets.tofile(fout)
+                        del offsets[:]
+                pos += len(line)
+            offsets.append(pos)
+        if fout is None:
+            self.offsets = offsets
+            return count
+        with fout:
+            offsets.tofile(fout)
+            fout.seek(0)
+            fout.write(HEADER.pack(MAGIC, stat.st_mtime_ns, stat.st_size, count))
+        os.replace(temp, self.indexPath)
+        return count
+
+    def __len__(self) -> int:
+        if self.count is None:
+            self.open()
+        return self.count
+
+    def __getitem__(self, n: int) -> str:
+        # Code of puzzle n, counting from 0.  Any blank lines between
+        # puzzle n and the next are read too, and stripped off.
+
+        count = len(self)
+        if n < 0:
+            n += count
+        if not 0 <= n < count:
+            raise IndexError(f'{self.path} has no puzzle {n}')
+        if self.offsets is not None:
+            start, end = self.offsets[n], self.offsets[n+1]
+        else:
+            self.idx.seek(HEADER.size + 8*n)
+            start, end = OFFSET.unpack(self.idx.read(OFFSET.size))
+        self.lib.seek(start)
+        return self.lib.read(end - start).decode('ascii').strip()
+
+    def close(self) -> None:
+        for f in (self.lib, self.idx):
+            if f:
+                f.close()
+        self.lib = self.idx = None
+        self.count = None
+
+    def record(self, n: int) -> tuple:
+        # (code, decoded cages) for puzzle n.  A text library holds
+        # only the codes, so the cages are left for Puzzle to decode.
+
+        return self[n], None
+
+
+def packRecord(code: str, decoded: list) -> bytes:
+    dim = int(code[0])
+    data = code.encode('ascii')
+    parts = [struct.pack('<H', len(data)), data, struct.pack('<H', len(decoded))]
+    for op, value, cells in decoded:
+        parts.append(struct.pack('<BIB', operation.index(op), value, len(cells)))
+        parts.append(struct.pack(f'<{len(cells)}H', *(x*dim + y for x, y in cells)))
+    return b''.join(parts)
+
+
+def unpackRecord(data: bytes, pos: int) -> tuple:
+    size, = struct.unpack_from('<H', data, pos)
+    pos += 2
+    code = data[pos:pos+size].decode('ascii')
+    pos += size
+    dim = int(code[0])
+    ncages, = struct.unpack_from('<H', data, pos)
+    pos += 2
+    decoded = []
+    for _ in range(ncages):
+        op, value, ncells = struct.unpack_from('<BIB', data, pos)
+        pos += 6
+        cells = struct.unpack_from(f'<{ncells}H', data, pos)
+        pos += 2*ncells
+        decoded.append((operation[op], value, [divmod(c, dim) for c in cells]))
+    return code, decoded
+
+
+def pack(textPath: str, packedPath: str, block: int = BLOCK) -> int:
+    # Convert a text library to the packed format.
+    # Return the number of puzzles written.
+
+    index = []
+    count = 0
+    temp = packedPath + '.tmp'
+    stat = os.stat(textPath)
+    with open(textPath) as fin, open(temp, 'wb') as fout:
+        fout.write(PACKHEADER.pack(PACKMAGIC, 0, 0, 0, 0, 0, 0))
+
+        def flush(records):
+            offsets, pos = [], 0
+            for r in records:
+                offsets.append(pos)
+                pos += len(r)
+            raw = struct.pack(f'<{len(offsets)}I', *offsets) + b''.join(records)
+            data = zlib.compress(raw, 9)
+            index.append((fout.tell(), len(data)))
+            fout.write(data)
+
+        records = []
+        for _, code, decoded in decodeLines(fin, textPath):
+            records.append(packRecord(code, decoded))
+            count += 1
+            if len(records) == block:
+                flush(records)
+                records = []
+        if records:
+            flush(records)
+        indexOffset = fout.tell()
+        for entry in index:
+            fout.write(BLOCKENTRY.pack(*entry))
+        fout.seek(0)
+        fout.write(PACKHEADER.pack(PACKMAGIC, count, block, len(index), indexOffset,
+                                   stat.st_mtime_ns, stat.st_size))
+    os.replace(temp, packedPath)
+    return count
+
+
+def isCurrent(packedPath: str, textPath: str) -> bool:
+    # Was the packed library made from the text library as it is now?
+    # With no text library there is nothing for it to be behind.
+
+    try:
+        stat = os.stat(textPath)
+    except FileNotFoundError:
+        return True
+    try:
+        with open(packedPath, 'rb') as fin:
+            header = PACKHEADER.unpack(fin.read(PACKHEADER.size))
+    except (OSError, struct.error):
+        return False
+    magic, *_, mtime, size = header
+    return (magic, mtime, size) == (PACKMAGIC, stat.st_mtime_ns, stat.st_size)
+
+
+class PackedLibrary:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.count = None
+        self.map = None
+        self.cached = None       # (block number, decompressed block)
+
+    def open(self) -> None:
+        with open(self.path, 'rb') as fin:
+            self.map = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, block, nblocks, indexOffset, _, _ = \
+            PACKHEADER.unpack_from(self.map, 0)
+        if magic != PACKMAGIC:
+            raise ValueError(f'{self.path} is not a packed puzzle library')
+        self.count, self.block, self.indexOffset = count, block, indexOffset
+
+    def __len__(self) -> int:
+        if self.count is None:
+            self.open()
+        return self.count
+
+    def getBlock(self, b: int) -> bytes:
+        if self.cached and self.cached[0] == b:
+            return self.cached[1]
+        offset, length = BLOCKENTRY.unpack_from(
+            self.map, self.indexOffset + b*BLOCKENTRY.size)
+        data = zlib.decompress(self.map[offset:offset+length])
+        self.cached = (b, data)
+        return data
+
+    def record(self, n: int) -> tuple:
+        # (code, decoded cages) for puzzle n, counting from 0
+
+        count = len(self)
+        if n < 0:
+            n += count
+        if not 0 <= n < count:
+            raise IndexError(f'{self.path} has no puzzle {n}')
+        b, k = divmod(n, self.block)
+        data = self.getBlock(b)
+        records = min(self.block, count - b*self.block)
+        pos, = struct.unpack_from('<I', data, 4*k)
+        return unpackRecord(data, 4*records + pos)
+
+    def __getitem__(self, n: int) -> str:
+        return self.record(n)[0]
+
+    def close(self) -> None:
+        if self.map:
+            self.map.close()
+        self.map = self.cached = None
+        self.count = None
+
+
+def ratingsPath(path: str) -> str:
+    return os.path.splitext(path)[0] + '.rat'
+
+
+def writeRatings(textPath: str, ratings: list) -> None:
+    # Write the rating index of a text library; ratings holds the
+    # (hardest level, steps) of each puzzle, in library order
+
+    stat = os.stat(textPath)
+    path = ratingsPath(textPath)
+    temp = path + '.tmp'
+    levels = array('B', (level for level, _ in ratings))
+    steps = array('H', (min(n, 0xffff) for _, n in ratings))
+    order = array('I', sorted(range(len(ratings)), key=lambda n: ratings[n]))
+    with open(temp, 'wb') as fout:
+        fout.write(HEADER.pack(RATEMAGIC, stat.st_mtime_ns, stat.st_size, len(ratings)))
+        for a in (levels, steps, order):
+            a.tofile(fout)
+    os.replace(temp, path)
+
+
+class Ratings:
+    def __init__(self, path: str) -> None:
+        # path is the text library the ratings are for
+
+        self.path = path
+        self.ratingsPath = ratingsPath(path)
+        self.count = None        # number of puzzles rated, 0 if no usable index
+        self.rat = None
+
+    def open(self) -> None:
+        # Check the index against the library file.  A missing or
+        # stale index leaves the library unrated.
+
+        self.count = 0
+        try:
+            stat = os.stat(self.path)
+            rat = open(self.ratingsPath, 'rb')
+        except OSError:
+            return
+        try:
+            magic, mtime, size, count = HEADER.unpack(rat.read(HEADER.size))
+        except struct.error:
+            rat.close()
+            return
+        if (magic, mtime, size) != (RATEMAGIC, stat.st_mtime_ns, stat.st_size):
+            rat.close()
+            return
+        self.count = count
+        self.rat = rat
+
+    def __len__(self) -> int:
+        if self.count is None:
+            self.open()
+        return self.count
+
+    def rating(self, n: int) -> tuple:
+        # (hardest level, steps) of puzzle n
+
+        if not 0 <= n < len(self):
+            raise IndexError(f'{self.ratingsPath} has no puzzle {n}')
+        self.rat.seek(HEADER.size + n)
+        level = self.rat.read(1)[0]
+        self.rat.seek(HEADER.size + self.count + 2*n)
+        steps, = struct.unpack('<H', self.rat.read(2))
+        return level, steps
+
+    def pick(self, lo: float, hi: float, rng=random) -> int:
+        # Number of a random puzzle whose rank by rating, as a fraction
+        # of the library, is in [lo, hi)
+
+        count = len(self)
+        if not count:
+            raise IndexError(f'{self.path} is not rated')
+        first = min(int(lo * count), count - 1)
+        rank = rng.randrange(first, max(int(hi * count), first + 1))
+        self.rat.seek(HEADER.size + 3*count + RANK.size*rank)
+        return RANK.unpack(self.rat.read(RANK.size))[0]
+
+    def close(self) -> None:
+        if self.rat:
+            self.rat.close()
+        self.rat = None
+        self.count = None
+
+
+def main():
+    # Convert every text library in keys/ to the packed format
+
+    import glob
+    for path in sorted(glob.glob('keys/*.txt')):
+        packed = os.path.splitext(path)[0] + '.kkb'
+        count = pack(path, packed)
+        print(f'{path} -> {packed}: {count} puzzles')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+'''
+A buffered channel for metrics and event records.
+
+Events are kept in memory in a ring buffer of the most recent
+capacity records, so recording one costs no I/O.  If a path is
+configured, a background thread appends new records to it as JSON
+lines every interval seconds, and once more when the program exits.
+Records that fall out of the ring before they are flushed are lost,
+and counted in dropped.  Failure to write the file (e.g. on a
+read-only install) turns flushing off; it is never an error.
+
+The shared channel is metrics.  Flushing is off by default; set the
+environment variable KENKEN_METRICS to a file name to turn it on, or
+call metrics.configure.
+'''
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class Metrics:
+    def __init__(self, capacity: int = 1024, path: str = None,
+                 interval: float = 5.0, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.events = deque(maxlen=capacity)  # (serial, time, event, fields)
+        self.lock = threading.Lock()
+        self.count = 0           # events recorded
+        self.written = 0         # serial of the first event not yet flushed
+        self.dropped = 0         # events lost before they were flushed
+        self.path = path
+        self.interval = interval
+        self.wake = threading.Event()
+        self.thread = None
+        atexit.register(self.close)
+
+    def configure(self, enabled: bool = None, path: str = None,
+                  interval: float = None) -> None:
+        # Change any of the settings given.  path '' turns flushing off.
+
+        if enabled is not None:
+            self.enabled = enabled
+        if interval is not None:
+            self.interval = interval
+        if path is not None:
+            self.flush()
+            self.path = path or None
+            self.written = self.count
+
+    def record(self, event: str, **fields) -> None:
+        # Add an event with the given fields, which should be
+        # JSON-serializable
+
+        if not self.enabled:
+            return
+        with self.lock:
+            self.events.append((self.count, time.time(), event, fields))
+            self.count += 1
+        if self.path and self.thread is None:
+            self.start()
+
+    def recent(self, event: str = None) -> list:
+        # The records still in the ring, oldest first, as dicts;
+        # only those of the given event, if one is given
+
+        with self.lock:
+            events = list(self.events)
+        return [dict(fields, event=e, time=t) for _, t, e, fields in events
+                if event is None or e == event]
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.run, name='metrics', daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        while self.thread is not None:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        # Append the records not yet written to the file
+
+        if not self.path:
+            return
+        with self.lock:
+            new = [r for r in self.events if r[0] >= self.written]
+            if new:
+                self.dropped += new[0][0] - self.written
+            elif self.count > self.written:
+                self.dropped += self.count - self.written
+            self.written = self.count
+        if not new:
+            return
+        lines = [json.dumps(dict(fields, event=e, time=t)) + '\n'
+                 for _, t, e, fields in new]
+        try:
+            with open(self.path, 'a') as fout:
+                fout.writelines(lines)
+        except OSError:
+            self.path = None
+
+    def close(self) -> None:
+        # Stop the background thread and write what is left
+
+        thread, self.thread = self.thread, None
+        if thread is not None:
+            self.wake.set()
+            thread.join(1.0)
+        self.flush()
+
+
+metrics = Metrics(path=os.environ.get('KENKEN_METRICS'))
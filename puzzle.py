@@ -1,8 +1,14 @@
-from collections import defaultdict, namedtuple
-from itertools import combinations
-import re
+from itertools import chain
+from collections import namedtuple
 import os
-from random import choice, shuffle, randint
+from solver import Solver
+from grader import Ladder, TECHNIQUES
+from grid import Grid
+from journal import Journal, RECORD
+from decode import decode
+from coloring import CageGraph, GraphColorer, minimumColoring, color6, colorings
+from metrics import metrics
+from timing import timed
 # from subprocess import run 
 
 ADD = '+'
@@ -11,7 +17,12 @@ MUL ='\xd7'
 DIV = '/'
 operation = [ADD, SUB, MUL, DIV]
 
-Update = namedtuple('Update', ['coords', 'answer', 'candidates']) 
+# A hint: the level of its technique (see grader.py; 0 for a wrong
+# answer), the cells it is based on, its conclusions as a dict mapping
+# cells to values, and the reason in words.  For a cell to be filled
+# in the values are its answer; otherwise they are candidates to remove.
+Hint = namedtuple('Hint', 'level cells values reason')
+
 class AnswerError(Exception):
     def __init__(self, cage):
         self.cells = cage
@@ -31,156 +42,100 @@ class Cage(list):
         answer = answer + ( '] %d' % self.color )   
         return answer
 
-    def touch(self, other):
-        for cell in self:
-            x,y = cell
-            if (x,y+1) in other: return True
-            if (x,y-1) in other: return True
-            if (x-1, y) in other: return True
-            if (x+1, y) in other: return True
-        return False
             
-class Journal(object):
-    def __init__(self, coords, before, after):
-        self.coords = coords
-        self.b_ans = before[0]
-        self.b_cand = before[1]
-        self.a_ans = after[0]
-        self.a_cand = after[1]
-    def __str__(self):
-        return f'{self.coords} before: {self.b.ans} {self.b.cand} after: {self.a.ans} {self.a.cand}'
-
 class Puzzle(object):            
-    def __init__(self, parent, codeString):
+    def __init__(self, parent, codeString, decoded=None, journalLimit=0):
         self.code = codeString
         self.dim = dim = int(codeString[0])
         self.cages        = {}
-        self.history      = []     # undo stack
-        self.answer       = {}
-        self.candidates   = defaultdict(list)
-        self.cageID       = {}     # map cell to its cage
-        self.future       = []     # redo stack
+        self.journal      = Journal(journalLimit)  # undo/redo
+        self.grid         = Grid(dim)  # answers and candidates
+        self.cageID       = [None] * dim * dim   # map flat cell index to its cage
         self.parent       = parent
-
-        self.makeCages(codeString)
-
-        for x in range(dim):
-            for y in range(dim):
-                self.answer[x,y] = 0  #impossible value
-
-        self.parent.control.setTime(0)            
+        self.solution     = None   # filled in by solve()
+        self.solver       = None   # made by solve()
+        self.values       = None   # the solution as a list by flat index, for hints
+        self.inference    = False  # make inferences when answers are entered
+        self.ladder       = None   # deductions for hints, made by the first hint
+        self.known        = None   # what the ladder knows of each cell; see hint
+        self.hinted       = {}     # candidates removed by hints, by flat index
+
+        self.makeCages(codeString, decoded)
+
+        # parent is None when the puzzle is used headless,
+        # e.g. for solving or validating the library
+        if parent is not None:
+            self.parent.control.setTime(0)
                  
-    def makeCages(self, codeString):
-        # Convert the cages codes from Tatham's representation.    
+    @timed('Puzzle.makeCages')
+    def makeCages(self, codeString, decoded=None):
+        # Build the cages for the puzzle.
+        # decoded, if given, is the result of decode(codeString), for
+        # instance as stored in a packed library, and saves reparsing it.
+
         dim = self.dim
-        cageCode, operCode = codeString[2:].split(',')
-        pattern = re.compile(r'[_abcdefghijklm]|[0-9]+')
-        groups = pattern.findall(cageCode)
-        symbols = '_abcdefghijklm'
-        code = ''
-        for group in groups:
-            if group in symbols:
-                code += group
-            else:
-                code += (int(group)-1)*code[-1]
-        code = [symbols.index(c) for c in code]
-        blocks = defaultdict(set)
-        for row in range(dim):
-            for col in range(dim):
-                blocks[row,col].add((row, col))
-        cursor = 0
-        for c in code:
-            while c:
-                c -=1
-                if cursor < dim*(dim-1): 
-                    # horizontal edge
-                    col = cursor//(dim-1) 
-                    row = cursor%(dim-1)   
-                    p0 =  row, col
-                    p1 =  row+1, col
-                else:
-                    # vertical edge
-                    row = cursor//(dim-1)-dim 
-                    col = cursor%(dim-1) + 1
-                    p0 = row, col-1
-                    p1 = row, col
-                union = blocks[p0] | blocks[p1]
-                for cell in union:
-                    blocks[cell] = union
-                cursor += 1
-            cursor += 1
-        
-        # I have the cell indices as (row, col), whereas Tatham uses
-        # (col, row).  The transpose function is used to make an 
-        # exact replica, rather than the transpose.
-        
+        if decoded is None:
+            decoded = self.decode(codeString)
         transpose = lambda x: (x[1], x[0])
-        cages = {}
-        cages = {b:blocks[b] for b in blocks if b== min(blocks[b], key=transpose)}
-        pattern =re.compile(r'[adms][0-9]+')
-        clues = pattern.findall(operCode)
-        try:
-            assert len(cages) == len(clues)
-        except:
-            print(codeString)
-            for item in cages.items():
-                print(item)
-        for id, clue  in zip(sorted(cages, key = transpose), clues):
-            cells = cages[id]
-            for cell in cells:
-                self.cageID[cell] = id
-            op = operation['asmd'.index(clue[0])]
-            answer = int(clue[1:])
-            self.cages[id] = Cage(op, answer, cells)
+        for op, answer, cells in decoded:
+            id = min(cells, key=transpose)
+            for x, y in cells:
+                self.cageID[x*dim + y] = id
+            self.cages[id] = cage = Cage(op, answer, cells)
+            cage.indices = [self.grid.index(c) for c in cage]
+            cage.number = len(self.cages) - 1
+        self.grid.setCages([cage.indices for cage in self.cages.values()])
         self.colorCages()
 
+    @staticmethod
+    def decode(codeString):
+        # Convert the cages codes from Tatham's representation.
+        # Return a list of (op, value, cells) triples, one per cage,
+        # where cells is a sorted list of (x, y) pairs.
+        # Raise decode.DecodeError if the code is malformed.
+
+        return decode(codeString)
+
+    @timed('Puzzle.colorCages')
     def colorCages(self):
         '''
-        Attempt to color the graph with 4 colors, using
+        Color the cages so that neighboring cages differ.  A coloring
+        found once is cached on disk under the puzzle code, so that
+        the puzzle always looks the same.  Otherwise, find a minimum
+        coloring by backtracking.  If that takes too long, attempt to
+        color the graph with 4 colors, using
         the iterated greedy algorithm 
         from "A Guide to Graph Colouring" by 
         R.M.R. Lewis.  In the unlikely event that the resulting
         coloring uses more than 6 colors, fall back on color6
         '''
-        cages = self.cages
-        def color6(graph): 
-            if len(graph)== 1:
-                id = list(graph.keys())[0]
-                cages[id].color = 0
-                return
-            for id in graph:   # There must be a vertex of degree <= 5
-                if len(graph[id]) < 6:
-                    break
-            nbrs = graph.pop(id)  # remove it from the graph
-            for nbr in nbrs:
-                graph[nbr].remove(id)
-            
-            # 6-color the reamining graph, then color the
-            # deleted vertex with a color unused by its neighbors
-             
-            color6(graph)       
-            nbdColors = {cages[n].color for n in nbrs}
-            color = min(set(range(6))-nbdColors)
-            cages[id].color = color
-
-        adj = defaultdict(set)
-        for u,v in combinations(cages.keys(), 2):
-            if cages[v].touch(cages[u]):
-                adj[u].add(v)
-                adj[v].add(u)
-
-        if not self.iteratedGreedy(adj):
-            color6(adj)
-
-    def iteratedGreedy(self, adj):
-        coloring, tries = GraphColorer(adj).iteratedGreedy(50, 4)
-        colors = max(coloring.values())+1
-        with open('results.log', 'a') as fout:
-            fout.write(f"{colors} colors {tries} iteration{'s' if tries > 1 else ''}\n")
+        cages = list(self.cages.values())   # indexed by cage number
+        graph = CageGraph(self.grid.cageOf, self.dim)
+        key = self.code.strip()
+        coloring = colorings.get(key)
+        if coloring is None or not graph.proper(coloring):
+            coloring = minimumColoring(graph)
+            if coloring is None:
+                if not self.iteratedGreedy(graph):
+                    for id, color in color6(graph.adjacency()).items():
+                        cages[id].color = color
+                coloring = [cage.color for cage in cages]
+            else:
+                metrics.record('coloring', colors=max(coloring, default=-1)+1, exact=True)
+            coloring = bytes(coloring)
+            colorings.put(key, coloring)
+        for cage, color in zip(cages, coloring):
+            cage.color = color
+
+    def iteratedGreedy(self, graph):
+        coloring, tries = GraphColorer(graph).iteratedGreedy(50, 4)
+        colors = max(coloring)+1
+        metrics.record('coloring', colors=colors, tries=tries)
         if colors > 6:
             return False
-        for id, color in coloring.items():
-            self.cages[id].color = color
+        cages = list(self.cages.values())
+        for number, color in enumerate(coloring):
+            cages[number].color = color
         return True
 
     # def hybrid(self, nbrs):
@@ -221,310 +176,395 @@ class Puzzle(object):
         # raise AnswerError.
         
         # If the user is entering (or changing) an answer, compute all resulting
-        # inferences, enter them in the history, and return a list of all cells
+        # inferences, enter them in the journal, and return a list of all cells
         # whose values change (whether answers or candidates.)
+        # Inferences are only made if self.inference is set.
         
         # If the user is simply reentering the same answer in a cell, do nothing
         # and return an empty list of updates.
         
-        history     = self.history
-        dim, answer = self.dim, self.answer
+        grid        = self.grid
+        answer      = grid.answer
+        index       = grid.index(focus)
         
-        if answer[focus] == value:
+        if answer[index] == value:
             return []
         
-        row = [x for x in range(dim) if answer[(x, focus[1])] == value]
-        col = [y for y in range(dim) if answer[(focus[0], y)] == value]
-        cells = [(x, focus[1]) for x in row] + [(focus[0], y) for y in col]
-        
+        cells = [grid.cell(c) for c in grid.conflicts(index, value)]
         if cells:
             raise AnswerError(cells)
         
-        id = self.cageID[focus]
+        id = self.cageID[index]
         cage = self.cages[id]
         
-        if len([x for x in cage if x != focus and answer[x]]) == len(cage) - 1:
+        others = grid.cageFilled[cage.number] - (answer[index] != 0)
+        if others == len(cage) - 1:
             if not(self.goodAnswer(cage, focus, value)):
                 raise AnswerError(cage)
             
-        candidates = self.candidates[focus][:]
-        before = answer[focus], candidates
-        after = value, candidates
-        history.append(Journal(focus, before, after))
-        answer[focus] = value
-        update = self.annal(focus)
-        self.future = []
-        return update
+        self.journal.begin()
+        self.change(index, value, grid.cands[index])
+        if self.inference:
+            self.infer(index)
+        return self.commit()
     
+    def change(self, index, answer, cands):
+        # Set the answer and candidates of a cell, recording the
+        # change in the current transaction of the journal
+
+        grid = self.grid
+        self.journal.record(index, grid.answer[index], grid.cands[index],
+                            answer, cands)
+        grid.setAnswer(index, answer)
+        grid.cands[index] = cands
+
+    def commit(self):
+        # End the current transaction, making it a single undoable
+        # unit.  Return the updates for the cells it changed.
+
+        grid = self.grid
+        return [grid.update(i) for i in self.journal.end()]
+
+    def infer(self, index):
+        # The answer in cell index has just changed.  Remove it from
+        # the candidates of the other cells in its row and column, and
+        # restrict the candidates of the last open cell of its cage to
+        # the values that complete the arithmetic.  A cell left with a
+        # single candidate gets it as its answer, and the inferences
+        # cascade from there.  Every change joins the current transaction.
+
+        grid, dim = self.grid, self.dim
+        answer, cands = grid.answer, grid.cands
+        stack = [index]
+        while stack:
+            i = stack.pop()
+            x, y = divmod(i, dim)
+            bit = 1 << answer[i]
+            narrowed = []
+            for p in chain(range(y, grid.size, dim), range(x*dim, (x+1)*dim)):
+                if cands[p] & bit and not answer[p]:
+                    self.change(p, 0, cands[p] & ~bit)
+                    narrowed.append(p)
+            cage = self.cages[self.cageID[i]]
+            empty = [c for c in cage.indices if not answer[c]]
+            if len(empty) == 1 and cands[empty[0]]:
+                p = empty[0]
+                mask = cands[p] & self.completions(cage)
+                if mask and mask != cands[p]:
+                    self.change(p, 0, mask)
+                    narrowed.append(p)
+            for p in narrowed:
+                mask = cands[p]
+                if mask and not mask & (mask-1) and not answer[p]:
+                    value = mask.bit_length() - 1
+                    if self.allowed(p, value):
+                        self.change(p, value, mask)
+                        stack.append(p)
+
+    def completions(self, cage):
+        # Bitmask of the values that complete the arithmetic of a cage
+        # with exactly one open cell
+
+        grid, dim = self.grid, self.dim
+        k, target = cage.number, cage.value
+        if cage.op == ADD:
+            values = [target - grid.cageSum[k]]
+        elif cage.op == MUL:
+            prod = grid.cageProd[k]
+            values = [target // prod] if target % prod == 0 else []
+        elif cage.op == SUB:
+            other = grid.cageSum[k]
+            values = [other - target, other + target]
+        else:
+            other = grid.cageSum[k]
+            values = [other * target]
+            if other % target == 0:
+                values.append(other // target)
+        mask = 0
+        for v in values:
+            if 1 <= v <= dim:
+                mask |= 1 << v
+        return mask
+
+    def allowed(self, index, value):
+        # Can value be entered as the answer in the empty cell index
+        # without a conflict or a wrong cage?
+
+        grid = self.grid
+        if grid.conflicts(index, value):
+            return False
+        cage = self.cages[self.cageID[index]]
+        if grid.cageFilled[cage.number] == len(cage) - 1:
+            return self.goodAnswer(cage, grid.cell(index), value)
+        return True
+
     def annal(self, focus):
-        return Update(focus, self.answer[focus], self.candidates[focus][:])
+        return self.grid.update(self.grid.index(focus))
     
     def toggleCandidate(self, focus, value):
         # Ignore if answer already in focus cell.
         # Otherwise, toggle the candidate value on or off.
                 
-        # Enter transaction in history and return update record
+        # Enter transaction in journal and return update records
         
-        history, answer, candidates = \
-               self.history, self.answer, self.candidates
+        grid = self.grid
+        index = grid.index(focus)
         
-        if answer[focus]:                         # answer present
+        if grid.answer[index]:                    # answer present
             return []
         
-        ann = self.annal(focus)
-        before = (ann.answer, ann.candidates)                   
-        
-        if value in candidates[focus]:            # toggle value off    
-            candidates[focus].remove(value)                                     
-        else:                                     # toggle value on 
-            candidates[focus].append(value)
-        after = (ann.answer, candidates[focus][:])  
-        history.append(Journal(focus, before, after))
-        self.future = []
-        return self.annal(focus)
+        # A single change with no answer: record it directly
+        journal, cands = self.journal, grid.cands[index]
+        journal.begin()
+        journal.record(index, 0, cands, 0, cands ^ 1 << value)
+        grid.cands[index] = cands ^ 1 << value
+        return self.commit()
     
     def getAllEntries(self):
         # Return a list of updates for all cell that have a value (answer or candidate).
         # Used for redrawing the board
         
-        dim = self.dim
-        answer, candidates = self.answer, self.candidates
-        updates = []
-        for j in range(dim):
-            for k in range(dim):
-                if answer[(j, k)] or candidates[(j, k)]:
-                    updates.append(self.annal( (j, k) ))
-        return updates        
+        grid = self.grid
+        return [grid.update(i) for i in range(grid.size) if not grid.isEmpty(i)]
     
     def undo(self):
-        # pop a journal entry of the undo stack and undo it
-        # push it to the redo stack
-        # return the update to post on the view
+        # undo the last transaction in the journal
+        # return the updates to post on the view
+        # The changes are read straight from the journal's array.
         
-        answer, candidates, history = self.answer, self.candidates, self.history
-        try:
-            journal = history.pop()
-        except IndexError:                    # user tried one too many undos
-            return None
-    
-        coords             = journal.coords
-        answer[coords]     = journal.b_ans
-        candidates[coords] = journal.b_cand[:]
-        self.future.append(journal)           # redo stack 
- 
-        return self.annal(coords)
+        span = self.journal.undo()
+        if span is None:
+            return []
+        grid, deltas = self.grid, self.journal.deltas
+        start, end = span
+        if end - start == RECORD:              # the usual single change
+            index = deltas[start]
+            grid.setAnswer(index, deltas[start+1] >> 8)
+            grid.cands[index] = deltas[start+2]
+            return [grid.update(index)]
+        for k in range(end - RECORD, start - 1, -RECORD):
+            index = deltas[k]
+            grid.setAnswer(index, deltas[k+1] >> 8)
+            grid.cands[index] = deltas[k+2]
+        return self.replayed(start, end)
 
     def redo(self):
-        # pop a journal entry of the redo stack and redo it
-        # push it to the undo stack
-        # return the update to post on the view
+        # redo the last transaction undone
+        # return the updates to post on the view
         
-        answer, candidates, future = self.answer, self.candidates, self.future
-        try:
-            journal = future.pop()
-        except IndexError:                    # user tried one too many redos
-            return None
-    
-        coords             = journal.coords
-        answer[coords]     = journal.a_ans
-        candidates[coords] = journal.a_cand[:]
-        self.history.append(journal)           # redo stack 
- 
-        return self.annal(coords)
+        span = self.journal.redo()
+        if span is None:
+            return []
+        grid, deltas = self.grid, self.journal.deltas
+        start, end = span
+        if end - start == RECORD:
+            index = deltas[start]
+            grid.setAnswer(index, deltas[start+1] & 0xff)
+            grid.cands[index] = deltas[start+3]
+            return [grid.update(index)]
+        for k in range(start, end, RECORD):
+            index = deltas[k]
+            grid.setAnswer(index, deltas[k+1] & 0xff)
+            grid.cands[index] = deltas[k+3]
+        return self.replayed(start, end)
+
+    def replayed(self, start, end):
+        # Updates for the cells changed by the journal records from
+        # start to end, in order of first change, so the cell the user
+        # changed comes first
+
+        grid, deltas = self.grid, self.journal.deltas
+        return [grid.update(i) for i in dict.fromkeys(deltas[start:end:RECORD])]
     
     def clearCell(self, focus):
         # If there is an answer in the current cell clear it.
         # If there is no answer, clear the candidate list.
         # Return a list of updates
         
-        answer, candidates, history = self.answer, self.candidates, self.history
-        if not answer[focus] and not candidates[focus]:
+        grid = self.grid
+        index = grid.index(focus)
+        if grid.isEmpty(index):
             return []                                # nothing to clear
         
-        ann = self.annal(focus)   
-        before = (ann.answer, ann.candidates)     
-        if answer[focus]:
-            answer[focus] = 0
+        self.journal.begin()
+        if grid.answer[index]:
+            self.change(index, 0, grid.cands[index])
         else:
-            candidates[focus] = []
-        ann = self.annal(focus)
-        after = (ann.answer, ann.candidates)
-        history.append(Journal(focus, before, after)) 
-        self.future = []
-        return ann
+            self.change(index, 0, 0)
+        return self.commit()
             
+    def solve(self):
+        # Return the solution as a dict mapping (x, y) to its value,
+        # or None if the cages admit no solution.
+        # The solution is computed once and cached.
+
+        if self.solution is None:
+            dim = self.dim
+            if self.solver is None:
+                self.solver = Solver(dim, self.cages.values())
+            values = self.solver.solve()
+            if values is None:
+                return None
+            self.solution = {(i // dim, i % dim): v for i, v in enumerate(values)}
+        return self.solution
+
+    @timed('Puzzle.hint')
+    def hint(self):
+        # The easiest deduction available from the answers and
+        # candidates entered so far, as a Hint, or None if the puzzle
+        # is completed or has no solution.  A wrong answer is pointed
+        # out first.  The techniques are those of grader.py, and the
+        # ladder of deductions is kept between calls: only the cells
+        # the user has changed since are fed to it, and only the rows,
+        # columns and cages they touch are searched again.
+
+        grid = self.grid
+        if self.isCompleted():
+            return None
+        self.prepareHints()
+        if self.ladder is None:
+            return None
+        for i in range(grid.size):
+            if grid.answer[i] and grid.answer[i] != self.values[i]:
+                value = grid.answer[i]
+                return Hint(0, [grid.cell(i)], {grid.cell(i): (value,)},
+                            f'the {value} in {self.name(i)} is wrong')
+        self.feed()
+
+        ladder = self.ladder
+        step = ladder.next()
+        if step is None:
+            step = ladder.trial(self.values)
+        # Removals are kept, as the user may not track candidates; a
+        # cell is left open until the user fills it in
+        for i, mask in step.removals.items():
+            self.hinted[i] = self.hinted.get(i, 0) | mask
+            ladder.restrict(i, ~mask)
+        return self.explain(step)
+
+    def prepareHints(self):
+        # Make the ladder of deductions for hints, unless the puzzle
+        # has no solution.  This solves the puzzle, which can take
+        # longer than a hint should, so it is done ahead when the
+        # board is idle after loading (see KenKen.puzzleFromCode).
+
+        if self.ladder is None and self.solve() is not None:
+            grid = self.grid
+            self.ladder = Ladder(self.solver)
+            self.values = [self.solution[grid.cell(i)] for i in range(grid.size)]
+            self.known = [self.solver.full] * grid.size
+
+    def feed(self):
+        # Bring the hint ladder up to date with the grid.  What the
+        # user knows of a cell is its answer, or else its candidates if
+        # they include its value, as a bitmask with bit 0 set for an
+        # answer.  If that has only narrowed since the last hint it is
+        # added to the ladder; if anything was undone or cleared the
+        # ladder is rebuilt, keeping the removals hinted.
+
+        grid, known = self.grid, self.known
+        full = self.ladder.solver.full
+        masks = []
+        for i in range(grid.size):
+            if grid.answer[i]:
+                masks.append(1 << grid.answer[i] | 1)
+            elif grid.cands[i] >> self.values[i] & 1:
+                masks.append(grid.cands[i])
+            else:
+                masks.append(full)
+        if any(mask & ~known[i] & ~1 or known[i] & ~mask & 1
+               for i, mask in enumerate(masks)):
+            self.ladder = Ladder(self.ladder.solver)
+            known[:] = [full] * grid.size
+            for i, mask in self.hinted.items():
+                self.ladder.restrict(i, ~mask)
+        ladder = self.ladder
+        for i, mask in enumerate(masks):
+            if mask != known[i]:
+                known[i] = mask
+                ladder.restrict(i, mask)
+                if mask & 1:
+                    ladder.place(i, grid.answer[i])
+
+    def name(self, i):
+        # Name of cell i for the user, by row and column
+        x, y = self.grid.cell(i)
+        return f'r{y+1}c{x+1}'
+
+    def explain(self, step):
+        # Hint for a step of the ladder
+
+        grid = self.grid
+        cage = self.cages[self.cageID[step.cells[0]]]
+        clue = f'{cage.value}{cage.op}'
+        removals = sorted(step.removals.items())
+        values = {grid.cell(i): tuple(v for v in range(1, mask.bit_length()) if mask >> v & 1)
+                  for i, mask in removals}
+        removed = '; '.join(f"{', '.join(map(str, values[grid.cell(i)]))} from {self.name(i)}"
+                            for i, _ in removals)
+        if step.cell >= 0:
+            values = {grid.cell(step.cell): (step.value,)}
+            target, value = self.name(step.cell), step.value
+        level = step.level
+        if level == 1:
+            reason = f'{target} can only be {value}'
+        elif level == 2:
+            line = 'row' if len({i % self.dim for i in step.cells}) == 1 else 'column'
+            reason = f'{value} has no other place in its {line} than {target}'
+        elif level == 3:
+            reason = f'the {clue} cage can\'t be made with {removed.replace(" from ", " in ")}'
+        elif level in (4, 6):
+            cells = ', '.join(self.name(i) for i in step.cells)
+            reason = f'{cells} share their candidates, so remove {removed}'
+        elif level == 5:
+            mask = 0
+            for i, m in removals:
+                mask |= m
+            rows = {i % self.dim for i, _ in removals}
+            inRow = sum(1 for i in step.cells if i % self.dim in rows)
+            line = 'row' if len(rows) == 1 and inRow > 1 else 'column'
+            needed = ', '.join(str(v) for v in range(1, mask.bit_length()) if mask >> v & 1)
+            reason = f'the {clue} cage must hold {needed} in its {line}, so remove {removed}'
+        else:
+            reason = f'no simpler step is left; {target} is {value}'
+        return Hint(level, [grid.cell(i) for i in step.cells], values,
+                    f'{TECHNIQUES[level-1]}: {reason}')
+
     def isCompleted(self):
         # Has user entered answer in each cell?
         
-        return len([x for x in list(self.answer.values()) if x]) == self.dim ** 2
+        return self.grid.filled == self.grid.size
 
     def restart(self):
         # Clear all user-entered data
         # User wants to start over
         
-        dim = self.dim
-        for i in range(dim):
-            for j in range(dim):
-                self.candidates[(i,j)] = []
-                self.answer[(i,j)] = 0
-        self.history = []        
+        self.grid.clear()
+        self.journal.clear()
+        self.ladder = self.known = None
+        self.hinted = {}
         
     def goodAnswer(self, cage, focus, value):
         # Precondition: Evey cell in cage, except focus, has an filled in
         # Return true iff filling value into focus makes the
         # arithmetic work out
+        # The cage's running sum and product give the other operands
+        # without visiting its cells.
         
         result = None
-        operands = [self.answer[x] for x in cage if x != focus]
-        operands += [value]
+        grid = self.grid
+        k = cage.number
+        old = grid.answer[grid.index(focus)]   # answer being replaced, if any
         if cage.op == ADD:
-            result = sum(operands) == cage.value
-        elif cage.op == SUB:
-            result = max(operands) - min(operands) == cage.value
+            result = grid.cageSum[k] - old + value == cage.value
         elif cage.op == MUL:
-            product = 1
-            for x in operands:
-                product *= x
-            result  = product == cage.value
-        elif cage.op == DIV:
-            result = max(operands) == min(operands) * cage.value
+            result = grid.cageProd[k] // (old or 1) * value == cage.value
+        else:
+            # subtraction and division cages have two cells
+            other = grid.cageSum[k] - old
+            big, small = max(other, value), min(other, value)
+            if cage.op == SUB:
+                result = big - small == cage.value
+            elif cage.op == DIV:
+                result = big == small * cage.value
         return result
-        
-class GraphColorer:
-    def __init__(self, adj: dict[set]) -> None:       
-        V = self.V = list(adj.keys())
-        self.nbrs = adj
-        self.n = len(self.V)
-        self.degree = {i: len(self.nbrs[i]) for i in V}
-        self.color = {i: 0 for i in V}
-        self.dsat = {i: 0 for i in V}
-        self.colorClass = defaultdict(set)
-
-    def choose(self, X) -> None:
-        # Return vertex with greatest degree of saturation
-        # Break ties by highest degree
-        # Break any remaining tie randomly
-  
-        deg = self.degree
-        sat = self.dsat
-        s, d = max((sat[v],deg[v]) for v in X)
-        candidates = [v for v in X if sat[v]==s and deg[v]==d]
-        return choice(candidates)
-
-    def DSatur(self) -> None:
-        X = self.V.copy()  # uncolored vertices
-        S = self.colorClass
-        nbrs = self.nbrs
-        nbrColors = defaultdict(set)
-        while X:
-            v = self.choose(X)
-            if not S:
-                S[0].add(v)
-                X.remove(v)
-                continue
-            for j in range(len(S)):
-                if not S[j] & nbrs[v]:
-                    S[j].add(v)
-                    break
-            else: # loop else
-                j += 1
-                S[j].add(v)
-            for u in nbrs[v]:
-                nbrColors[u].add(j)
-                self.dsat[u] = len(nbrColors[u])
-            X.remove(v)
-
-    def greedy(self) -> None:
-        colorClass = self.colorClass = defaultdict(set)
-        V = self.V
-        nbrs = self.nbrs
-        colorClass[0].add(V[0])
-        for v in V[1:]:
-            for c in colorClass:
-                if not (nbrs[v] & colorClass[c]):
-                    colorClass[c].add(v)
-                    break
-            else:   # loop else
-                colorClass[c+1].add(v)
-
-    def flatten(self, X:list[set]) -> list:
-        return [x for s in X for x in s]
-
-    def largestFirst(self) -> None:
-        # Reorder the vertices in order of the color classes
-        # in decreasing order of size
-
-        #print('largestFirst')
-        #old = self.V
-        c = sorted(self.colorClass.values(), key= lambda x:len(x), reverse=True)
-        self.V = self.flatten(c)
-        # if old == self.V:
-        #     print('no change')
-        #self.printV()
-
-    def reverse(self) -> None:
-        # Reorder the vertices in the reverse of the color classes
-       
-        # print('reverse')
-        # old = self.V
-        classes = self.colorClass
-        c = [classes[i] for i in range(len(classes))]
-        self.V = self.flatten(c)
-        # if old == self.V:
-        #     print('no change')
-        #self.printV()
-
-    def randomize(self) -> None:
-        # Reorder the vertices by shuffling the color classes
-       
-        # print('randomize')
-        # old = self.V
-        c = list(self.colorClass.values())
-        shuffle(c)
-        self.V = self.flatten(c)
-        # if old == self.V:
-        #     print('no change')
-        #self.printV()
-
-    def printV(self):
-        for v in self.V:
-            print(self.V, end = ' ')
-        print()
-
-    def iteratedGreedy(self, limit: int, goal:int = 0) -> tuple[dict, int]:
-        # Iterated greedy coloring
-        # limit is the maximum number of colorings to try
-        # goal is a target for the number of colors; if
-        # this goal is achieved, the coloring stops early.
-        # The default goal is 0, so there is no target
-
-        self.DSatur()    # color initially with DSatur algorithm
-        tries = 1
-        if len(self.colorClass) <= goal:
-            # Color the graph
-            colors = self.colorClass
-            self.color = {v:c for c in colors for v in colors[c]}
-            return self.color, 1
-        while tries < limit:
-            r = randint(1,13)
-
-            # Reorder the vertices according to largesrt first, reversal,
-            # or random shuffling randomly, with proportin 5:5:3, and
-            # then use the greedy algorithm
-              
-            if r <= 5:
-                self.largestFirst()
-            elif r <= 10:
-                self.reverse()
-            else:
-                self.randomize()
-            self.greedy()
-            tries += 1
-            if len(self.colorClass) <= goal:
-                break
-        colors = self.colorClass
-
-        # Color the graph
-        self.color = {v:c for c in colors for v in colors[c]}
-
-        return self.color, tries
@@ -0,0 +1,131 @@
+'''
+Opt-in timing of the hot paths.
+
+Durations are collected in a histogram per stage: makeCages and
+colorCages in Puzzle, load, redraw and postUpdate in Board, each
+keystroke handler in Control, and 'keystroke', the whole path from a
+key press to the redrawn board.  The buckets grow geometrically, four
+to a doubling, so percentiles are exact to within about 19%.
+
+Timing is off unless the environment variable KENKEN_TIMING is set to
+a file name, or timings.enable() is called.  When a file is given the
+histograms are written to it as JSON when the program exits.  When
+timing is off, a timed function costs one extra call and a test.
+'''
+import atexit
+import json
+import math
+import os
+import time
+from functools import wraps
+
+PER_DOUBLING = 4         # histogram buckets for each doubling of duration
+FLOOR = 1e-6             # upper bound in seconds of bucket 0
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self) -> None:
+        self.counts = {}     # bucket -> number of durations in it
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        if seconds <= FLOOR:
+            b = 0
+        else:
+            b = math.ceil(math.log2(seconds / FLOOR) * PER_DOUBLING)
+        self.counts[b] = self.counts.get(b, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p: float) -> float:
+        # Duration in seconds below which p percent of those added
+        # fall, as the upper bound of its bucket
+
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for b in sorted(self.counts):
+            seen += self.counts[b]
+            if seen >= rank:
+                break
+        return min(FLOOR * 2 ** (b / PER_DOUBLING), self.max)
+
+    def summary(self) -> dict:
+        # Count and milliseconds for the mean, percentiles and maximum
+
+        ms = 1000
+        return {'count': self.count,
+                'mean': self.total / self.count * ms if self.count else 0.0,
+                'p50': self.percentile(50) * ms,
+                'p90': self.percentile(90) * ms,
+                'p99': self.percentile(99) * ms,
+                'max': self.max * ms}
+
+
+class Timings:
+    def __init__(self, path: str = None) -> None:
+        self.enabled = bool(path)
+        self.path = path
+        self.stages = {}     # stage name -> Histogram
+        atexit.register(self.dump)
+
+    def enable(self, path: str = None) -> None:
+        # Turn timing on; path is a file for the JSON dump at exit
+
+        self.enabled = True
+        if path:
+            self.path = path
+
+    def add(self, stage: str, seconds: float) -> None:
+        try:
+            self.stages[stage].add(seconds)
+        except KeyError:
+            histogram = self.stages[stage] = Histogram()
+            histogram.add(seconds)
+
+    def percentile(self, stage: str, p: float) -> float:
+        histogram = self.stages.get(stage)
+        return histogram.percentile(p) if histogram else 0.0
+
+    def timed(self, name: str):
+        # Decorator timing each call of a function as stage name
+
+        def decorate(f):
+            @wraps(f)
+            def timedCall(*args, **kwargs):
+                if not self.enabled:
+                    return f(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    self.add(name, time.perf_counter() - start)
+            return timedCall
+        return decorate
+
+    def summary(self) -> dict:
+        return {name: h.summary() for name, h in sorted(self.stages.items())}
+
+    def dump(self) -> None:
+        # Write the summary and raw histograms to the file, if there is one
+
+        if not (self.path and self.stages):
+            return
+        data = {name: dict(h.summary(), buckets={str(b): n for b, n in sorted(h.counts.items())})
+                for name, h in sorted(self.stages.items())}
+        try:
+            with open(self.path, 'w') as fout:
+                json.dump(data, fout, indent=1)
+        except OSError:
+            pass
+
+
+timings = Timings(os.environ.get('KENKEN_TIMING'))
+timed = timings.timed
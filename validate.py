@@ -0,0 +1,158 @@
+#! /usr/bin/python3
+'''
+Check the puzzle libraries.
+
+Every line of each library file must be a puzzle code that decodes
+cleanly, with as many clues as cages, whose clues can all be met, and
+which has exactly one solution.  Puzzles are checked in parallel over
+a multiprocessing pool, and each bad line is reported as it is found,
+as file:line: problem.  The search for solutions stops at the second.
+
+    python3 validate.py [--jobs N] [--fail-fast] [--self-test] [FILE ...]
+
+With no files, all of keys/*.txt are checked.  The exit status is 1 if
+any line is bad.  --self-test first checks that the validator passes
+a good code and reports each of a set of malformed ones (MALFORMED).
+'''
+import argparse
+import glob
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+from decode import decode, DecodeError, SUB, DIV
+from puzzle import Cage
+from solver import Solver
+
+CHUNK = 64               # puzzles sent to a worker at a time
+
+# A good code, and malformed variants of it that must be reported
+GOOD = '6:a_a_7a__aa_3a_3a_aba_b__aa_3a__a3,s1m10a7m6d2a7m12d2a7m72s3s3d3s2s1a7d2'
+MALFORMED = {
+    'extra walls':          GOOD.replace('a3,', 'a3_a_b,'),
+    'stray character':      GOOD.replace('6:a', '6:xa'),
+    'run past the end':     GOOD.replace('a3,', 'a310,'),
+    'junk after clues':     GOOD + 'zz',
+    'wall code too short':  GOOD.replace('a3,', 'a,'),
+    'missing clue':         GOOD[:-2],
+    'no dimension':         GOOD[1:],
+    'no comma':             GOOD.replace(',', ''),
+    'no tuples':            GOOD.replace(',s1m10', ',s1m11'),
+    'two solutions':        '2:d,a6',
+}
+
+
+def tasks(paths):
+    # Generate (path, line number, code) for the non-blank lines of
+    # the files, reading them lazily
+
+    for path in paths:
+        with open(path) as fin:
+            for lineno, line in enumerate(fin, 1):
+                code = line.strip()
+                if code:
+                    yield path, lineno, code
+
+
+def check(task) -> tuple:
+    # Return (path, line number, problem), where problem is None for
+    # a good puzzle
+
+    path, lineno, code = task
+    try:
+        decoded = decode(code)
+    except DecodeError as e:
+        return path, lineno, str(e)
+    except (KeyError, IndexError):
+        return path, lineno, f'malformed puzzle code {code!r}'
+    dim = int(code.split(':')[0])
+    cages = []
+    for op, value, cells in decoded:
+        if op in (SUB, DIV) and len(cells) != 2:
+            return path, lineno, f'{op}{value} cage with {len(cells)} cells'
+        cages.append(Cage(op, value, cells))
+    solver = Solver(dim, cages)
+    for cage, tuples in zip(cages, solver.tuples):
+        if not tuples:
+            return path, lineno, f'no values meet clue {cage.value}{cage.op} at {cage[0]}'
+    count = solver.countSolutions(2)
+    if count == 0:
+        return path, lineno, 'no solution'
+    if count > 1:
+        return path, lineno, 'more than one solution'
+    return path, lineno, None
+
+
+def selfTest(out=sys.stdout) -> int:
+    # Check GOOD and MALFORMED.  Return the number of failures.
+
+    failures = 0
+    _, _, problem = check(('GOOD', 1, GOOD))
+    if problem:
+        print(f'self-test: good code reported: {problem}', file=out)
+        failures += 1
+    for name, code in MALFORMED.items():
+        _, _, problem = check((name, 1, code))
+        if not problem:
+            print(f'self-test: {name} not reported: {code!r}', file=out)
+            failures += 1
+    return failures
+
+
+def validate(paths, jobs=None, failFast=False, out=sys.stdout) -> tuple:
+    # Check the puzzles in the files, writing a line to out for each
+    # bad one.  Return the number of puzzles checked and the number bad.
+
+    jobs = jobs or os.cpu_count() or 1
+    checked = bad = 0
+    work = tasks(paths)
+    pool = Pool(jobs) if jobs > 1 else None
+    try:
+        if pool:
+            results = pool.imap(check, work, CHUNK)
+        else:
+            results = map(check, work)
+        for path, lineno, problem in results:
+            checked += 1
+            if problem:
+                bad += 1
+                print(f'{path}:{lineno}: {problem}', file=out, flush=True)
+                if failFast:
+                    break
+    finally:
+        if pool:
+            pool.terminate()
+    return checked, bad
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check puzzle libraries.')
+    parser.add_argument('files', nargs='*', help='library files (default keys/*.txt)')
+    parser.add_argument('--jobs', '-j', type=int, default=0,
+                        help='worker processes (default one per CPU)')
+    parser.add_argument('--fail-fast', action='store_true',
+                        help='stop at the first bad puzzle')
+    parser.add_argument('--self-test', action='store_true',
+                        help='first check that malformed codes are reported')
+    args = parser.parse_args()
+
+    if args.self_test:
+        failures = selfTest()
+        print(f'self-test: {len(MALFORMED) + 1 - failures} of {len(MALFORMED) + 1} cases right',
+              file=sys.stderr)
+        if failures:
+            return 1
+
+    paths = args.files or sorted(glob.glob('keys/*.txt'))
+    start = time.perf_counter()
+    checked, bad = validate(paths, args.jobs, args.fail_fast)
+    elapsed = time.perf_counter() - start
+    rate = checked / elapsed if elapsed else 0
+    print(f'{checked} puzzles in {len(paths)} files, {bad} bad, '
+          f'{elapsed:.1f} s ({rate:.0f} puzzles/s)', file=sys.stderr)
+    return 1 if bad else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())